@@ -3,12 +3,24 @@ import subprocess
 import tempfile
 from fastapi import FastAPI, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from recorder.recorder import record
 from recorder.player import replay_flow
 from common import state
 from common import selectorHelper
+from common.traceHelper import summarize_traces
+from common.metricsHelper import render_metrics
+from common.logHelper import configure_logging, parse_module_levels
+from common.jobHelper import JobManager, JobQueueFull
+from common.processPoolHelper import ReplayProcessPool
+from common.httpHelper import api_client
+from common.healingHelper import healing_store, export_healed_flow
+from common.flowFormatHelper import flow_to_container, container_to_flow
+from common.coalesceHelper import coalesce_flow
+from common.agentConfigHelper import agent_config
+from common.harHelper import HAR_DIR, har_path, new_har_name
+from config import LOG_LEVELS, MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, REPLAY_WORKER_PROCESSES, REPLAY_PROFILE
 from typing import Optional
 import logging
 import os
@@ -18,19 +30,34 @@ import asyncio
 
 # --- Logging ---
 log_path = Path(__file__).parent / "botflows_agent.log"
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_path, mode='a', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Spawned replay workers re-import this file as __mp_main__; they log to their own file and must not hold this one
+if __name__ != "__mp_main__":
+    configure_logging(log_path, level=logging.DEBUG, module_levels=parse_module_levels(LOG_LEVELS))
 logger = logging.getLogger("botflows-agent")
 
 # --- FastAPI App ---
 app = FastAPI()
 state.connections = []
+# Created on startup, so importing this module (as the spawned workers do) builds no pool or queue
+replay_pool = None
+jobs = None
+
+@app.on_event("startup")
+async def start_services():
+    global replay_pool, jobs
+    replay_pool = ReplayProcessPool(REPLAY_WORKER_PROCESSES, log_path=log_path) if REPLAY_WORKER_PROCESSES else None
+    # Recordings run for the whole session on a worker of their own, so previews never wait behind one
+    jobs = JobManager(concurrency=MAX_CONCURRENT_JOBS or REPLAY_WORKER_PROCESSES or None, max_queued=MAX_QUEUED_JOBS,
+                      dedicated={"record": 1})
+    agent_config.subscribe(lambda config: logger.info(f"[Config] Agent settings updated: {config}"))
+    agent_config.start_watching()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    agent_config.stop_watching()
+    if replay_pool:
+        replay_pool.shutdown()
+    await api_client.aclose()
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +69,8 @@ app.add_middleware(
 
 class RecordRequest(BaseModel):
     url: str
+    # Also capture the session's network traffic for offline replays
+    har: bool = False
 
 @app.websocket("/ws/actions")
 async def websocket_endpoint(websocket: WebSocket):
@@ -58,12 +87,21 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @app.post("/api/record")
 async def start_recording(req: RecordRequest):
+    # There is one active page, so only one recording at a time
+    if jobs.active("record"):
+        return JSONResponse({"error": "A recording is already in progress"}, status_code=409)
+
     state.is_recording = True
     state.current_url = req.url
     try:
         logger.info(f"Starting recording for: {req.url}")
-        asyncio.create_task(record(req.url))
-        return {"status": "started", "url": req.url}
+        har_name = new_har_name(req.url) if req.har else None
+        job = jobs.submit("record", lambda: record(req.url, har_name), priority=10, payload={"url": req.url, "har": har_name})
+        return {"status": "started", "url": req.url, "jobId": job.id, "har": har_name}
+    except JobQueueFull as e:
+        state.is_recording = False
+        state.current_url = None
+        return JSONResponse({"error": str(e)}, status_code=429)
     except Exception as e:
         state.is_recording = False
         state.current_url = None
@@ -71,11 +109,25 @@ async def start_recording(req: RecordRequest):
         return {"error": str(e)}
 
 @app.post("/api/replay")
-async def replay_by_json(request: Request):
+async def replay_by_json(request: Request, priority: int = 0, profile: Optional[str] = None, har: Optional[str] = None,
+                         har_strict: bool = False):
     try:
-        json_str = (await request.body()).decode("utf-8")
-        asyncio.create_task(replay_flow(json_str))
-        return {"status": "replaying"}
+        # JSON or a compact flow container; replay_flow tells them apart
+        flow_data = await request.body()
+        profile = profile or REPLAY_PROFILE or None
+        if har:
+            har_path(har)  # reject bad names before queueing
+        args = (flow_data, profile, har, har_strict)
+        # Previews stay in-process because they drive the recorder's overlay; background replays can use workers
+        run = (lambda: replay_pool.run(*args)) if replay_pool else (lambda: replay_flow(*args))
+        job = jobs.submit("replay", run, priority=priority,
+                          payload={"worker": "process" if replay_pool else "inline", "profile": profile or "default",
+                                   "har": har, "harStrict": har_strict})
+        return {"status": "replaying", "jobId": job.id}
+    except JobQueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
         logger.exception("Replay failed")
         return {"error": str(e)}
@@ -83,9 +135,15 @@ async def replay_by_json(request: Request):
 @app.post("/api/preview-replay")
 async def preview_replay(req: Request):
     try:
-        json_str = await req.body()
-        await replay_flow(json_str.decode("utf-8"))
-        return {"status": "ok"}
+        flow_data = await req.body()
+        # Someone is watching a preview, so it jumps ahead of queued background replays
+        job = jobs.submit("replay", lambda: replay_flow(flow_data), priority=5, payload={"preview": True})
+        await asyncio.shield(job.done)
+        if job.status != "succeeded":
+            return {"status": "error", "details": job.error or job.status, "jobId": job.id}
+        return {"status": "ok", "jobId": job.id, "result": job.result}
+    except JobQueueFull as e:
+        return JSONResponse({"status": "error", "details": str(e)}, status_code=429)
     except Exception as e:
         return {"status": "error", "details": str(e)}
 
@@ -110,6 +168,81 @@ def get_status():
         "url": state.current_url if state.is_recording else None
     }
 
+@app.get("/api/jobs")
+def list_jobs():
+    return {
+        "concurrency": jobs.concurrency,
+        "queued": jobs.queued_count(),
+        "jobs": [job.as_dict(include_result=False) for job in reversed(jobs.jobs.values())],
+    }
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job.as_dict()
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    if not jobs.cancel(job_id):
+        return JSONResponse({"error": "Job not found or already finished"}, status_code=404)
+    return {"status": "cancelling", "jobId": job_id}
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/replay-traces/summary")
+def get_replay_trace_summary(limit: int = 200, format: str = "json"):
+    """Per-step timing across the latest replay traces; format=folded returns flame graph input."""
+    summary = summarize_traces(limit=limit)
+    if format == "folded":
+        return PlainTextResponse("\n".join(summary["folded"]))
+    return summary
+
+@app.post("/api/healing/export")
+async def export_healed_selectors(request: Request):
+    """Returns the posted flow with selectors that healed it on earlier replays promoted to first choice."""
+    try:
+        flow = await request.json()
+        patched, count = export_healed_flow(flow, healing_store)
+        return {"status": "ok", "patchedSteps": count, "flow": patched}
+    except Exception as e:
+        logger.exception("Healing export failed")
+        return JSONResponse({"status": "error", "details": str(e)}, status_code=500)
+
+@app.post("/api/flows/compact")
+async def compact_flow(request: Request):
+    """Flow JSON in, compact flow container out."""
+    try:
+        flow = json.loads(await request.body())
+        return Response(flow_to_container(flow), media_type="application/octet-stream")
+    except Exception as e:
+        return JSONResponse({"status": "error", "details": str(e)}, status_code=400)
+
+@app.post("/api/flows/expand")
+async def expand_flow(request: Request):
+    """Compact flow container in, flow JSON out."""
+    try:
+        return container_to_flow(await request.body())
+    except Exception as e:
+        return JSONResponse({"status": "error", "details": str(e)}, status_code=400)
+
+@app.post("/api/flows/coalesce")
+async def coalesce_saved_flow(request: Request):
+    """Merges redundant focus/click/input steps of a saved flow and reports how many steps were saved."""
+    try:
+        flow, report = coalesce_flow(await request.json())
+        return {"status": "ok", "report": report, "flow": flow}
+    except Exception as e:
+        return JSONResponse({"status": "error", "details": str(e)}, status_code=400)
+
+@app.get("/api/har")
+def list_har_archives():
+    archives = sorted(HAR_DIR.glob("*.har.zip"), key=lambda p: p.stat().st_mtime, reverse=True) if HAR_DIR.exists() else []
+    return [{"name": p.name[:-len(".har.zip")], "bytes": p.stat().st_size, "modified": p.stat().st_mtime} for p in archives]
+
 @app.post("/api/target-pick-mode")
 async def enable_target_pick_mode(request: Request):
     try:
@@ -198,7 +331,8 @@ if __name__ == "__main__":
 
     class SuppressStatusLogs(logging.Filter):
         def filter(self, record):
-            return "/api/status" not in record.getMessage()
+            message = record.getMessage()
+            return "/api/status" not in message and "/metrics" not in message
 
     logging.getLogger("uvicorn.access").addFilter(SuppressStatusLogs())
 
@@ -0,0 +1,70 @@
+"""Memory held by a recording session's events: plain dicts against EventRecord with a shared BlobStore.
+
+Events arrive as JSON from the page binding, so every event brings its own copies of its strings; each element
+gets a focus, click and change event with the same ~700-byte outerHTML.
+
+    python benchmarks/bench_event_records.py [events]
+"""
+import os
+import sys
+import json
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common.recordHelper import BlobStore, EventRecord
+
+
+def page_events(count: int):
+    for i in range(count):
+        element = i // 3
+        outer_html = (f'<input id="field-{element}" name="field{element}" class="form-control input-lg" '
+                      f'type="text" data-row="{element}" aria-label="Field {element}">' + " " * 560)
+        yield json.dumps({
+            "action": ("focus", "click", "change")[i % 3],
+            "url": "https://app.example.com/orders/edit",
+            "value": f"value {element}",
+            "timestamp": 1_700_000_000_000 + i,
+            "tagName": "input",
+            "id": f"field-{element}",
+            "name": f"field{element}",
+            "classList": ["form-control", "input-lg"],
+            "attributes": {"id": f"field-{element}", "name": f"field{element}", "type": "text"},
+            "text": "",
+            "elementText": "",
+            "boundingBox": {"x": 10, "y": 20 + element, "width": 300, "height": 32},
+            "outerHTML": outer_html,
+            "selector": f"#field-{element}",
+            "domPath": f"html > body > form > div:nth-of-type({element + 1}) > input#field-{element}",
+            "xpath": f'//*[@id="field-{element}"]',
+        })
+
+
+def measure(build, payloads) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(payloads)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def as_dicts(payloads):
+    return [json.loads(p) for p in payloads]
+
+
+def as_records(payloads):
+    blobs = BlobStore()
+    return [EventRecord.from_event(json.loads(p), blobs, []) for p in payloads], blobs
+
+
+def main(count=10_000):
+    payloads = list(page_events(count))
+    for name, build in (("dicts", as_dicts), ("records", as_records)):
+        used = measure(build, payloads)
+        print(f"{name:8s} {used / count:7.0f} B/event  {used / 1e6:6.1f} MB for {count} events")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,78 @@
+"""Event-loop cost of agent logging while broadcasting recorded events.
+
+Each event logs the websocket debug line with a 20 KB outerHTML plus one info line, while a 1 ms ticker
+measures loop lag. Modes: "old" (basicConfig, sync file + stdout at DEBUG, eager f-string), "new-debug"
+(queue logging with the recorder forced to DEBUG) and "new" (queue logging, default levels).
+
+    python benchmarks/bench_logging.py [mode [events]]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MODES = ("old", "new-debug", "new")
+
+
+def configure(mode: str, log_dir: str):
+    if mode == "old":
+        logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                            handlers=[logging.FileHandler(os.path.join(log_dir, "agent.log"), encoding="utf-8"),
+                                      logging.StreamHandler(sys.stdout)])
+    else:
+        from common.logHelper import configure_logging
+        levels = {"recorder.recorder": "DEBUG"} if mode == "new-debug" else {}
+        configure_logging(os.path.join(log_dir, "agent.log"), module_levels=levels)
+
+
+async def run(mode: str, events: int):
+    log = logging.getLogger("recorder.recorder")
+    message = {"type": "click", "outerHTML": "<div class='x'>" + "y" * 20000 + "</div>", "timestamp": 1}
+    lags = []
+    stop = False
+
+    async def ticker():
+        while not stop:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    ticking = asyncio.create_task(ticker())
+    spent = 0.0
+    for i in range(events):
+        started = time.perf_counter()
+        if mode == "old":
+            log.debug(f"[WS] Broadcasted: {message}")
+        else:
+            log.debug("[WS] Broadcasted: %s", message)
+        log.info(f"[Standard] event {i} handled")
+        spent += time.perf_counter() - started
+        await asyncio.sleep(0)
+    stop = True
+    await ticking
+
+    lags.sort()
+    return spent / events * 1e6, lags[int(len(lags) * 0.99)] * 1000, lags[-1] * 1000
+
+
+def main(mode: str, events: int):
+    # The stdout handler writes to /dev/null; results go to the real stdout
+    out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    configure(mode, tempfile.mkdtemp())
+    per_event, p99, worst = asyncio.run(run(mode, events))
+    out.write(f"{mode:10s} {per_event:7.1f} us/event on loop, lag p99 {p99:.2f} ms, max {worst:.2f} ms\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3000)
+    else:
+        # Logging is process-wide, so each mode gets a fresh interpreter
+        for mode in MODES:
+            subprocess.run([sys.executable, __file__, mode], check=True)
@@ -0,0 +1,79 @@
+"""Per-row cost of step transforms: the old re-parse-every-call path against compiled transforms.
+
+    python benchmarks/bench_transforms.py [rows]
+"""
+import os
+import re
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common.transformHelper import compile_transform
+
+logger = logging.getLogger("bench")
+
+CASES = [
+    ("regex", r"ID:(\d+)", lambda i: f"Order ID:{i} shipped"),
+    ("js", "value.slice(2, 8)", lambda i: f"  item-{i:06d}  "),
+    ("js", "value.trim()", lambda i: f"  item-{i:06d}  "),
+]
+
+
+# Before compilation: apply_transformations/apply_js_like_transform as player.py had them
+def legacy_apply_transformations(value, transform_type, transform):
+    if not transform_type or not transform or not value:
+        return value
+    try:
+        if transform_type == "regex":
+            match = re.compile(transform).search(value)
+            if match:
+                logger.info(f"[Transform Apply] Regex match with pattern: {transform}")
+                return match.group(1) if match.lastindex else match.group(0)
+            logger.info("[Transform Apply] No match found")
+            return "(no match)"
+        elif transform_type == "js":
+            logger.info(f"[Transform Apply] JS simulation with: value{transform}")
+            return legacy_apply_js_like_transform(value, transform)
+    except Exception as e:
+        logger.warning(f"[Transform Apply Error] {e}")
+        return "(error)"
+    return value
+
+
+def legacy_apply_js_like_transform(value, transform):
+    if transform == "value.trim()":
+        return value.strip()
+    elif transform.startswith("value.slice(") and transform.endswith(")"):
+        parts = [int(p.strip()) for p in transform[12:-1].split(",")]
+        return value[parts[0]:] if len(parts) == 1 else value[parts[0]:parts[1]]
+    elif ".replace(" in transform:
+        pattern_match = re.search(r"\.replace\(/(.*)/\$\s*,\s*'([^']*)'\)", transform)
+        if pattern_match:
+            value = re.sub(pattern_match.group(1).replace("\\\\", "\\"), pattern_match.group(2), value)
+        if ".trim()" in transform:
+            value = value.strip()
+    return value
+
+
+def timed(fn, values) -> float:
+    started = time.perf_counter()
+    fn(values)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def main(rows=10_000):
+    # Per-row logging off, so only the transform work is measured
+    logging.disable(logging.CRITICAL)
+    for transform_type, transform, make in CASES:
+        values = [make(i) for i in range(rows)]
+        old = timed(lambda vs: [legacy_apply_transformations(v, transform_type, transform) for v in vs], values)
+        per_row = timed(lambda vs: [compile_transform(transform_type, transform)(v) for v in vs], values)
+        column = timed(lambda vs: compile_transform(transform_type, transform).apply_many(vs), values)
+        print(f"{transform_type:5s} {transform:34s} old {old:5.2f} us/row  compiled {per_row:5.2f} us/row  "
+              f"apply_many {column:5.2f} us/row")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -9,5 +9,6 @@ class BotflowsDataTable:
     # def to_log_string(self):
     #     return render_datatable(self.rows)
 
-    def get_column_values(self, column_name):
-        return [row.get(column_name, "") for row in self.rows]
+    def get_column_values(self, column_name, transform=None):
+        values = [row.get(column_name, "") for row in self.rows]
+        return transform.apply_many(values) if transform else values
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ui/agent_config.json is the one file the settings window writes and the agent reads
+CONFIG_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "ui", "agent_config.json"))
+CHECK_INTERVAL_SECONDS = 2.0
+
+# key -> (type, default)
+CONFIG_SCHEMA = {
+    "use_bundled_chrome": (bool, False),
+    "chrome_path": (str, ""),
+    # name -> {headless, block_resource_types, block_domains, reduce_motion}
+    "replay_profiles": (dict, {}),
+}
+DEFAULT_CONFIG = {key: default for key, (_, default) in CONFIG_SCHEMA.items()}
+
+# Settings of one replay profile: key -> (type, item type for lists)
+REPLAY_PROFILE_SCHEMA = {
+    "headless": (bool, None),
+    "block_resource_types": (list, str),
+    "block_domains": (list, str),
+    "reduce_motion": (bool, None),
+}
+
+
+def validate_replay_profiles(profiles: dict) -> tuple:
+    """Returns (profiles, problems): unknown or wrong-typed settings are dropped, so one typo can't break a profile."""
+    valid = {}
+    problems = []
+    for name, settings in profiles.items():
+        if not isinstance(settings, dict):
+            problems.append(f"replay profile '{name}' must be an object; ignored")
+            continue
+        valid[name] = {}
+        for key, value in settings.items():
+            expected = REPLAY_PROFILE_SCHEMA.get(key)
+            if expected is None:
+                problems.append(f"replay profile '{name}': unknown key '{key}' ignored")
+            elif not isinstance(value, expected[0]) or (
+                    expected[1] and not all(isinstance(v, expected[1]) for v in value)):
+                item = f" of {expected[1].__name__}" if expected[1] else ""
+                problems.append(f"replay profile '{name}': '{key}' must be {expected[0].__name__}{item}; ignored")
+            else:
+                valid[name][key] = value
+    return valid, problems
+
+
+def validate_config(data) -> tuple:
+    """Returns (config, problems): wrong-typed values fall back to their defaults, unknown keys are kept."""
+    if not isinstance(data, dict):
+        return dict(DEFAULT_CONFIG), ["config root must be an object"]
+
+    config = dict(DEFAULT_CONFIG)
+    problems = []
+    for key, value in data.items():
+        expected = CONFIG_SCHEMA.get(key)
+        if expected is None:
+            problems.append(f"unknown key '{key}'")
+        elif not isinstance(value, expected[0]):
+            problems.append(f"'{key}' must be {expected[0].__name__}, got {type(value).__name__}; using default")
+            continue
+        elif key == "replay_profiles":
+            value, profile_problems = validate_replay_profiles(value)
+            problems.extend(profile_problems)
+        config[key] = value
+    return config, problems
+
+
+def read_config_file(path=CONFIG_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        config, problems = validate_config(json.load(f))
+    for problem in problems:
+        logger.warning(f"[Config] {path}: {problem}")
+    return config
+
+
+def save_config_file(config: dict, path=CONFIG_PATH):
+    # Replace atomically so a watcher never reads a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp, path)
+
+
+class AgentConfig:
+    """Agent settings loaded once and refreshed when the file's mtime changes; subscribers get each new version."""
+
+    def __init__(self, path=CONFIG_PATH, check_interval=CHECK_INTERVAL_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._config = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._subscribers = []
+        self._watcher = None
+
+    def get(self) -> dict:
+        """Current config; without a running watcher it re-stats the file at most every check_interval."""
+        now = time.monotonic()
+        if self._config is None or (self._watcher is None and now - self._checked_at >= self.check_interval):
+            self._checked_at = now
+            if self._reload_if_changed():
+                self._notify()
+        return self._config
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._config is not None and mtime == self._mtime:
+            return False
+
+        try:
+            config = read_config_file(self.path) if mtime is not None else dict(DEFAULT_CONFIG)
+        except Exception as e:
+            logger.warning(f"[Config] Could not load {self.path}: {e}; keeping previous settings")
+            if self._config is None:
+                self._config = dict(DEFAULT_CONFIG)
+            return False
+
+        changed = self._config is not None and config != self._config
+        self._config, self._mtime = config, mtime
+        if changed:
+            logger.info(f"[Config] Reloaded {self.path}")
+        return changed
+
+    def _notify(self):
+        for callback in self._subscribers:
+            try:
+                callback(self._config)
+            except Exception:
+                logger.exception("[Config] Subscriber failed")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                # Subscribers run on the loop, not in the stat thread
+                if await asyncio.to_thread(self._reload_if_changed):
+                    self._notify()
+            except Exception as e:
+                logger.warning(f"[Config] Watch failed: {e}")
+
+    def start_watching(self):
+        if self._watcher is None:
+            self.get()
+            self._watcher = asyncio.create_task(self._watch())
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+
+agent_config = AgentConfig()
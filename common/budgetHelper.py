@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEP_BUDGET_MS = 30000
+# Leaf steps always run under a budget; loops only when the flow sets budgetMs on them
+BUDGETED_STEP_TYPES = {"navigate", "uiaction"}
+
+current_budget = ContextVar("botflows_step_budget", default=None)
+
+
+class StepBudgetExceeded(Exception):
+    pass
+
+
+class StepBudget:
+    """Wall-clock allowance for one step; every nested wait draws from what is left."""
+
+    __slots__ = ("step_id", "label", "total_ms", "started", "deadline", "spent", "exceeded")
+
+    def __init__(self, step_id, label, total_ms, parent=None):
+        self.step_id = step_id
+        self.label = label
+        self.total_ms = total_ms
+        self.started = time.monotonic()
+        self.deadline = self.started + total_ms / 1000
+        if parent:
+            # A child can never outlive the loop it runs in
+            self.deadline = min(self.deadline, parent.deadline)
+        self.spent = {}
+        self.exceeded = False
+
+    def remaining_ms(self) -> float:
+        return max(0.0, (self.deadline - time.monotonic()) * 1000)
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+    def timeout(self, cap_ms=None) -> int:
+        """Returns a Playwright timeout no larger than cap_ms or the remaining budget."""
+        remaining = self.remaining_ms()
+        if remaining <= 0:
+            self.exceeded = True
+            raise StepBudgetExceeded(f"step '{self.step_id}' used its {self.total_ms}ms budget")
+        if cap_ms is not None:
+            remaining = min(cap_ms, remaining)
+        # Playwright treats 0 as "no timeout"
+        return max(1, int(remaining))
+
+    def charge(self, category: str, ms: float):
+        self.spent[category] = self.spent.get(category, 0.0) + ms
+
+    @contextmanager
+    def track(self, category: str):
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.charge(category, (time.monotonic() - started) * 1000)
+
+
+def budget_for_step(step: dict):
+    """Builds the budget for a step from its budgetMs, or None when the step runs unbudgeted."""
+    budget_ms = step.get("budgetMs")
+    if budget_ms is None:
+        if (step.get("type") or "").lower() not in BUDGETED_STEP_TYPES:
+            return None
+        budget_ms = DEFAULT_STEP_BUDGET_MS
+    return StepBudget(step.get("id"), step.get("label") or step.get("type"), int(budget_ms), current_budget.get())
+
+
+def timeout_ms(cap_ms: int) -> int:
+    budget = current_budget.get()
+    return budget.timeout(cap_ms) if budget else cap_ms
+
+
+async def budget_sleep(seconds: float):
+    budget = current_budget.get()
+    if budget:
+        seconds = min(seconds, budget.remaining_ms() / 1000)
+    await asyncio.sleep(seconds)
+
+
+def check_budget():
+    budget = current_budget.get()
+    if budget:
+        budget.timeout()
+
+
+@contextmanager
+def track(category: str):
+    budget = current_budget.get()
+    if not budget:
+        yield None
+        return
+    with budget.track(category):
+        yield budget
+
+
+class BudgetReport:
+    """Collects finished step budgets for the end-of-replay summary."""
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, budget: StepBudget):
+        self.steps.append({
+            "stepId": budget.step_id,
+            "label": budget.label,
+            "budgetMs": budget.total_ms,
+            "elapsedMs": round(budget.elapsed_ms(), 1),
+            "exceeded": budget.exceeded,
+            "spent": {k: round(v, 1) for k, v in budget.spent.items()},
+        })
+
+    def totals(self) -> dict:
+        totals = {}
+        for entry in self.steps:
+            for category, ms in entry["spent"].items():
+                totals[category] = totals.get(category, 0.0) + ms
+        return totals
+
+    def summary(self, top=5) -> str:
+        if not self.steps:
+            return "[Budget] No budgeted steps ran"
+
+        exceeded = [s for s in self.steps if s["exceeded"]]
+        lines = [f"[Budget] {len(self.steps)} step(s), {len(exceeded)} over budget"]
+        lines.append("  by category: " + ", ".join(
+            f"{category}={ms:.0f}ms" for category, ms in sorted(self.totals().items(), key=lambda kv: -kv[1])
+        ))
+        for entry in sorted(self.steps, key=lambda s: -s["elapsedMs"])[:top]:
+            spent = ", ".join(f"{k}={v:.0f}ms" for k, v in entry["spent"].items())
+            flag = " EXCEEDED" if entry["exceeded"] else ""
+            lines.append(
+                f"  {entry['stepId']} ({entry['label']}): {entry['elapsedMs']:.0f}/{entry['budgetMs']}ms{flag}"
+                + (f" [{spent}]" if spent else "")
+            )
+        return "\n".join(lines)
@@ -0,0 +1,121 @@
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# A pending event waits this long for a follower that makes it redundant
+HOLD_SECONDS = 0.4
+
+_PRECURSORS = {"focus", "mousedown"}
+_ACTIVATING = {"mousedown", "focus", "click", "dblclick", "type", "change", "select"}
+_FOCUSING = {"click", "dblclick", "type", "change", "select"}
+_VALUE_ACTIONS = {"type", "change"}
+_MAPPING_FIELDS = ("dynamicValue", "transformType", "transform")
+
+
+def _field(event, name):
+    return event.get(name) if isinstance(event, dict) else getattr(event, name, None)
+
+
+def _action(event) -> str:
+    return (_field(event, "action") or "").lower()
+
+
+def _same_target(a, b) -> bool:
+    return (bool(_field(a, "selector")) and _field(a, "selector") == _field(b, "selector")
+            and (_field(a, "framePath") or []) == (_field(b, "framePath") or [])
+            and _field(a, "parentId") == _field(b, "parentId"))
+
+
+def _mapping_kept(dropped, kept) -> bool:
+    # A dropped event must not take a {{column}} mapping or transform with it
+    return all(_field(dropped, f) is None or _field(dropped, f) == _field(kept, f) for f in _MAPPING_FIELDS)
+
+
+def merge_rule(prev, cur):
+    """Which of two consecutive events is redundant: ("prev" | "cur", rule name), or None to keep both."""
+    if not _same_target(prev, cur):
+        return None
+    prev_action, cur_action = _action(prev), _action(cur)
+
+    # Clicking or typing focuses the element anyway; a mousedown precedes every click
+    if prev_action in _PRECURSORS and cur_action in _ACTIVATING and _mapping_kept(prev, cur):
+        return "prev", f"{prev_action}+{cur_action}"
+    if cur_action == "focus" and prev_action in _FOCUSING:
+        return "cur", f"{prev_action}+focus"
+    # Input carries the field's whole value, so only the last one matters
+    if prev_action in _VALUE_ACTIONS and cur_action in _VALUE_ACTIONS and _mapping_kept(prev, cur):
+        return "prev", f"{prev_action}+{cur_action}"
+    return None
+
+
+class EventCoalescer:
+    """Live compaction while recording: holds the latest event until the next one shows whether it is redundant."""
+
+    def __init__(self, hold_seconds=HOLD_SECONDS):
+        self.hold_seconds = hold_seconds
+        self.pending = None
+        self.saved = Counter()
+
+    def push(self, event) -> list:
+        """Returns the events that are final now."""
+        if self.pending is None:
+            self.pending = event
+            return []
+
+        merged = merge_rule(self.pending, event)
+        if merged:
+            side, rule = merged
+            self.saved[rule] += 1
+            if side == "prev":
+                self.pending = event
+            return []
+
+        ready, self.pending = self.pending, event
+        return [ready]
+
+    def flush(self) -> list:
+        ready, self.pending = self.pending, None
+        return [ready] if ready is not None else []
+
+    def reset(self):
+        self.pending = None
+        self.saved.clear()
+
+
+def _referenced_ids(flow: list) -> set:
+    return {ref for step in flow for ref in (step.get("parentId"), step.get("source")) if ref}
+
+
+def coalesce_flow(flow: list):
+    """Offline pass over a saved flow; only neighbouring uiAction steps under the same parent are merged."""
+    referenced = _referenced_ids(flow)
+    saved = Counter()
+    result = []
+    last_action = {}  # parentId -> index in result of the latest uiAction step under that parent
+
+    for step in flow:
+        is_action = (step.get("type") or "uiAction").lower() == "uiaction" and step.get("action")
+        parent = step.get("parentId")
+        if not is_action:
+            result.append(step)
+            # Anything else between two actions (a loop, a navigation) breaks the sequence
+            last_action.pop(parent, None)
+            continue
+
+        prev_index = last_action.get(parent)
+        merged = merge_rule(result[prev_index], step) if prev_index is not None else None
+        if merged:
+            side, rule = merged
+            dropped = result[prev_index] if side == "prev" else step
+            if dropped.get("id") not in referenced:
+                saved[rule] += 1
+                if side == "prev":
+                    result[prev_index] = step
+                continue
+
+        last_action[parent] = len(result)
+        result.append(step)
+
+    report = {"before": len(flow), "after": len(result), "saved": len(flow) - len(result), "rules": dict(saved)}
+    return result, report
@@ -1,28 +1,33 @@
+import time
 from playwright.async_api import Page
 from common import state
-import httpx
-from config import API_BASE_URL, API_KEY
 from bs4 import BeautifulSoup
+from common.metricsHelper import SNAPSHOT_UPLOAD_BYTES, SNAPSHOT_UPLOAD_SECONDS
+from common.httpHelper import api_client
 
 async def upload_snapshot_to_api(url: str, html: str):
     """Uploads full HTML snapshot to the selector snapshot endpoint."""
-    endpoint = f"{API_BASE_URL}/api/selectoranalysis/submit"
-    headers = {"x-api-key": API_KEY}
-
     payload = {
         "url": url,
         "domHtml": html  # send as HTML string
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(endpoint, json=payload, headers=headers)
-            if response.status_code == 200:
-                print("Snapshot uploaded to blob:", response.json().get("file"))
-            else:
-                print("Failed to upload snapshot:", response.status_code, response.text)
-        except Exception as ex:
-            print("Exception during snapshot upload:", str(ex))
+    SNAPSHOT_UPLOAD_BYTES.observe(len(html.encode("utf-8")) if html else 0)
+    started = time.perf_counter()
+    outcome = "error"
+
+    try:
+        response = await api_client.post("/api/selectoranalysis/submit", json=payload)
+        if response.status_code == 200:
+            outcome = "ok"
+            print("Snapshot uploaded to blob:", response.json().get("file"))
+        else:
+            outcome = "rejected"
+            print("Failed to upload snapshot:", response.status_code, response.text)
+    except Exception as ex:
+        print("Exception during snapshot upload:", str(ex))
+    finally:
+        SNAPSHOT_UPLOAD_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
 
 def find_element_by_text_and_tag(html: str, target_text: str, target_tag: str, target_classes: list[str]):
     """Searches DOM for a tag with given text and classes."""
@@ -0,0 +1,210 @@
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_ATTRIBUTE = "data-botflows-fp"
+# Attributes that identify an element across builds; weights say how much a match counts
+STABLE_ATTRIBUTES = {"id": 3, "name": 2, "data-testid": 3, "data-test": 3, "data-qa": 3, "aria-label": 2,
+                     "placeholder": 2, "title": 1, "type": 1, "role": 1, "href": 1, "for": 1, "alt": 1}
+# The best candidate must beat the runner-up by this much, or the match is ambiguous; repeated rows only differ
+# in path and position, so the lead is small even when it is right
+MIN_MARGIN = 0.03
+_TEXT_LIMIT = 200
+_tokens = itertools.count(1)
+
+# Scores every element of the recorded tag against the fingerprint in one pass and tags the winner.
+# Each signal scores 0..1; signals the recording lacks are left out of the weighting instead of counting as misses.
+# Text and DOM path are the costly signals, so they are only worked out for candidates that can still come first
+# or second once the cheap signals are in.
+RESOLVE_SCRIPT = """
+([fp, token, attrName]) => {
+  const WEIGHTS = { selector: 0.25, attributes: 0.25, text: 0.2, path: 0.15, classes: 0.05, box: 0.1 };
+  const TEXT_LIMIT = 200;
+  const norm = s => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase().slice(0, TEXT_LIMIT);
+  const ownText = el => {
+    // Reads text nodes only until there is enough: a container's full text can be most of the page
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let out = '';
+    for (let n = walker.nextNode(); n && out.length < TEXT_LIMIT; n = walker.nextNode()) {
+      const parent = n.parentNode.nodeName;
+      if (parent === 'SCRIPT' || parent === 'STYLE' || parent === 'NOSCRIPT') continue;
+      out = (out + ' ' + n.data.slice(0, TEXT_LIMIT * 2)).replace(/\\s+/g, ' ').trimStart();
+    }
+    return norm(out);
+  };
+  const bigrams = s => { const out = new Map(); for (let i = 0; i < s.length - 1; i++) { const g = s.slice(i, i + 2); out.set(g, (out.get(g) || 0) + 1); } return out; };
+  const dice = (a, b) => {
+    if (!a && !b) return 1;
+    if (a === b) return 1;
+    if (a.length < 2 || b.length < 2) return 0;
+    const A = bigrams(a), B = bigrams(b);
+    let common = 0;
+    for (const [g, n] of A) common += Math.min(n, B.get(g) || 0);
+    return (2 * common) / (a.length + b.length - 2);
+  };
+  const domPath = el => {
+    const parts = [];
+    for (; el && el.nodeType === 1; el = el.parentElement) {
+      let part = el.nodeName.toLowerCase();
+      if (el.id) part += '#' + CSS.escape(el.id);
+      else {
+        const sibs = Array.from(el.parentNode?.children || []).filter(e => e.nodeName === el.nodeName);
+        if (sibs.length > 1) part += `:nth-of-type(${sibs.indexOf(el) + 1})`;
+      }
+      parts.unshift(part);
+    }
+    return parts;
+  };
+  const pathSimilarity = (a, b) => {
+    // Compared leaf first: a wrapper added near the root costs little, a different parent costs a lot
+    const tagOf = part => part.split(/[#:]/)[0];
+    let same = 0;
+    for (let i = 1; i <= Math.min(a.length, b.length); i++) {
+      const x = a[a.length - i], y = b[b.length - i];
+      if (x === y) same += 1 / i;
+      else if (tagOf(x) === tagOf(y)) same += 0.5 / i;
+    }
+    let best = 0;
+    for (let i = 1; i <= Math.max(a.length, b.length); i++) best += 1 / i;
+    return best ? same / best : 0;
+  };
+  const hits = query => {
+    // Playwright-only syntax (text=, :has-text) can't be checked here, and a selector that matches nothing
+    // tells no candidate apart; either way that signal is left out
+    try { const found = new Set(query()); return found.size ? found : null; } catch (e) { return null; }
+  };
+
+  document.querySelectorAll(`[${attrName}]`).forEach(el => el.removeAttribute(attrName));
+
+  const tag = (fp.tagName || '').toLowerCase();
+  const candidates = Array.from(document.querySelectorAll(tag || '*')).slice(0, 5000);
+  if (!candidates.length) return null;
+
+  const selectorHits = fp.selector ? hits(() => document.querySelectorAll(fp.selector)) : null;
+  const xpathHits = fp.xpath ? hits(() => {
+    const found = document.evaluate(fp.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({ length: found.snapshotLength }, (_, i) => found.snapshotItem(i));
+  }) : null;
+  const attrEntries = Object.entries(fp.attributes || {});
+  const attrTotal = attrEntries.reduce((n, [, entry]) => n + entry[1], 0);
+  const text = norm(fp.text);
+  const path = fp.domPath ? fp.domPath.split('>').map(p => p.trim()).filter(Boolean) : null;
+  const classes = new Set(fp.classList || []);
+  const box = fp.boundingBox;
+
+  let weights = 0;
+  if (selectorHits || xpathHits) weights += WEIGHTS.selector;
+  if (attrTotal) weights += WEIGHTS.attributes;
+  if (classes.size) weights += WEIGHTS.classes;
+  if (box && box.width) weights += WEIGHTS.box;
+  const deferred = (fp.text ? WEIGHTS.text : 0) + (path ? WEIGHTS.path : 0);
+  weights += deferred;
+  if (!weights) return null;
+
+  const cheap = candidates.map(el => {
+    const signals = {};
+    if (selectorHits || xpathHits) {
+      // A selector matching many elements says little about any one of them
+      const s = selectorHits && selectorHits.has(el) ? 1 / selectorHits.size : 0;
+      const x = xpathHits && xpathHits.has(el) ? 1 / xpathHits.size : 0;
+      signals.selector = Math.max(s, x);
+    }
+    if (attrTotal) {
+      let matched = 0;
+      for (const [name, [value, weight]] of attrEntries) {
+        if (el.getAttribute(name) === value) matched += weight;
+      }
+      signals.attributes = matched / attrTotal;
+    }
+    if (classes.size) {
+      const own = Array.from(el.classList);
+      const shared = own.filter(c => classes.has(c)).length;
+      signals.classes = shared / (classes.size + own.length - shared);
+    }
+    const rect = el.getBoundingClientRect();
+    const visible = rect.width > 0 && rect.height > 0;
+    if (box && box.width) {
+      const dx = (rect.x + rect.width / 2) - (box.x + box.width / 2);
+      const dy = (rect.y + rect.height / 2) - (box.y + box.height / 2);
+      const size = Math.min(rect.width * rect.height, box.width * box.height) / Math.max(rect.width * rect.height, box.width * box.height, 1);
+      signals.box = Math.exp(-Math.hypot(dx, dy) / 200) * (0.5 + size / 2);
+    }
+    let total = 0;
+    for (const [name, value] of Object.entries(signals)) total += WEIGHTS[name] * value;
+    const factor = (visible ? 1 : 0.5) / weights;
+    return { el, signals, total, factor, upper: (total + deferred) * factor };
+  });
+
+  // Best-first by the most the deferred signals could add; stop once no one left can beat the runner-up
+  cheap.sort((a, b) => b.upper - a.upper);
+  let best = null, second = null;
+  for (const c of cheap) {
+    if (second && c.upper < second.score) break;
+    if (fp.text) {
+      c.signals.text = dice(text, ownText(c.el));
+      c.total += WEIGHTS.text * c.signals.text;
+    }
+    if (path) {
+      c.signals.path = pathSimilarity(path, domPath(c.el));
+      c.total += WEIGHTS.path * c.signals.path;
+    }
+    c.score = c.total * c.factor;
+    if (!best || c.score > best.score) [best, second] = [c, best];
+    else if (!second || c.score > second.score) second = c;
+  }
+
+  best.el.setAttribute(attrName, token);
+  const round = n => Math.round(n * 1000) / 1000;
+  return {
+    confidence: round(best.score),
+    runnerUp: round(second ? second.score : 0),
+    candidates: candidates.length,
+    signals: Object.fromEntries(Object.entries(best.signals).map(([k, v]) => [k, round(v)])),
+  };
+}
+"""
+
+
+def fingerprint_of(step: dict) -> dict:
+    """The parts of a recorded step that describe its element, trimmed to what the scorer uses."""
+    attributes = step.get("attributes") or {}
+    return {
+        "tagName": step.get("tagName") or "",
+        "selector": step.get("selector") or "",
+        "xpath": step.get("xpath") or "",
+        "domPath": step.get("domPath") or "",
+        "attributes": {name: [str(attributes[name]), weight] for name, weight in STABLE_ATTRIBUTES.items()
+                       if attributes.get(name) not in (None, "")},
+        "classList": list(step.get("classList") or []),
+        "text": (step.get("text") or step.get("elementText") or "")[:_TEXT_LIMIT],
+        "boundingBox": step.get("boundingBox"),
+    }
+
+
+async def resolve_by_fingerprint(target, step: dict, min_confidence: float):
+    """Finds the recorded element in one evaluate. Returns the match (its "selector" points at the tagged
+    element) when it is confident and unambiguous, or None so the caller falls back to its selector cascade."""
+    fp = fingerprint_of(step)
+    if not fp["tagName"] and not fp["selector"]:
+        return None
+
+    token = str(next(_tokens))
+    try:
+        match = await target.evaluate(RESOLVE_SCRIPT, [fp, token, FINGERPRINT_ATTRIBUTE])
+    except Exception as e:
+        logger.warning(f"[Fingerprint] Resolve failed: {e}")
+        return None
+    if not match:
+        return None
+
+    margin = match["confidence"] - match["runnerUp"]
+    if match["confidence"] < min_confidence or margin < MIN_MARGIN:
+        logger.info(f"[Fingerprint] Not confident ({match['confidence']}, runner-up {match['runnerUp']}), "
+                    f"falling back to selectors")
+        return None
+
+    match["selector"] = f'[{FINGERPRINT_ATTRIBUTE}="{token}"]'
+    logger.info(f"[Fingerprint] Matched with confidence {match['confidence']} among {match['candidates']} "
+                f"candidates {match['signals']}")
+    return match
@@ -0,0 +1,149 @@
+import json
+import zlib
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"BFLW"
+VERSION = 2
+_HEADER = struct.Struct("<4sBcI")  # magic, version, codec, hot section length
+
+# Bulky fields only selector recovery reads. The fingerprint fields (attributes, classList, domPath, xpath,
+# elementText) stay hot: the player scores every step against them before trying selectors
+COLD_FIELDS = frozenset(("outerHTML", "innerText", "metadata"))
+# Version 1 containers also kept the fingerprint fields cold
+_COLD_FIELDS_BY_VERSION = {1: COLD_FIELDS | {"attributes", "domPath", "xpath", "classList", "elementText"},
+                           2: COLD_FIELDS}
+
+
+def _codec():
+    return b"m" if msgpack else b"j"
+
+
+def _encode(obj, codec: bytes) -> bytes:
+    if codec == b"m":
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data, codec: bytes):
+    if codec == b"m":
+        if msgpack is None:
+            raise ValueError("flow container was written with msgpack, which is not installed")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(bytes(data))
+
+
+class LazyStep(dict):
+    """Step dict whose cold fields are decompressed on first access."""
+
+    __slots__ = ("_cold", "_cold_fields")
+
+    def __init__(self, hot, cold_loader=None, cold_fields=COLD_FIELDS):
+        super().__init__(hot)
+        self._cold = cold_loader
+        self._cold_fields = cold_fields
+
+    def hydrate(self):
+        if self._cold is not None:
+            loader, self._cold = self._cold, None
+            for key, value in loader().items():
+                self.setdefault(key, value)
+        return self
+
+    def get(self, key, default=None):
+        if self._cold is not None and key in self._cold_fields:
+            self.hydrate()
+        return dict.get(self, key, default)
+
+    def __missing__(self, key):
+        if self._cold is not None and key in self._cold_fields:
+            self.hydrate()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if self._cold is not None and key in self._cold_fields:
+            self.hydrate()
+        return dict.__contains__(self, key)
+
+
+def hydrate(step: dict) -> dict:
+    """Loads every cold field of a step; plain dicts are returned as they are."""
+    return step.hydrate() if isinstance(step, LazyStep) else step
+
+
+def is_flow_container(data) -> bool:
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == MAGIC
+
+
+def flow_to_container(flow: list) -> bytes:
+    """Packs a flow: hot fields column by column in one compressed block, cold fields per step for lazy loading."""
+    codec = _codec()
+    keys = []
+    for step in flow:
+        for key in step:
+            if key not in COLD_FIELDS and key not in keys:
+                keys.append(key)
+
+    columns = {key: [step.get(key) for step in flow] for key in keys}
+    # Columns can't tell a missing key from None, so absent keys are listed separately
+    missing = {key: [i for i, step in enumerate(flow) if key not in step] for key in keys}
+    missing = {key: idx for key, idx in missing.items() if idx}
+
+    cold_blobs, cold_index, offset = [], [], 0
+    for step in flow:
+        cold = {key: step[key] for key in COLD_FIELDS if key in step}
+        if not cold:
+            cold_index.append(None)
+            continue
+        blob = zlib.compress(_encode(cold, codec))
+        cold_index.append([offset, len(blob)])
+        cold_blobs.append(blob)
+        offset += len(blob)
+
+    hot = zlib.compress(_encode({"count": len(flow), "keys": keys, "columns": columns, "missing": missing,
+                                 "cold": cold_index}, codec))
+    return _HEADER.pack(MAGIC, VERSION, codec, len(hot)) + hot + b"".join(cold_blobs)
+
+
+def load_container(data) -> list:
+    """Unpacks the hot fields of a container; cold fields stay compressed until a step asks for one."""
+    data = memoryview(data)
+    magic, version, codec, hot_length = _HEADER.unpack_from(data)
+    if magic != MAGIC or version not in _COLD_FIELDS_BY_VERSION:
+        raise ValueError(f"not a version {VERSION} flow container")
+    cold_fields = _COLD_FIELDS_BY_VERSION[version]
+
+    body = _HEADER.size + hot_length
+    hot = _decode(zlib.decompress(data[_HEADER.size:body]), codec)
+    keys, columns = hot["keys"], hot["columns"]
+    missing = {key: set(idx) for key, idx in hot["missing"].items()}
+
+    def cold_loader(offset, length):
+        return lambda: _decode(zlib.decompress(data[body + offset:body + offset + length]), codec)
+
+    flow = []
+    for i in range(hot["count"]):
+        step = {key: columns[key][i] for key in keys if i not in missing.get(key, ())}
+        entry = hot["cold"][i]
+        flow.append(LazyStep(step, cold_loader(*entry) if entry else None, cold_fields))
+    return flow
+
+
+def container_to_flow(data) -> list:
+    """Expands a container back to the plain JSON-compatible flow, cold fields included."""
+    return [dict(step.hydrate()) for step in load_container(data)]
+
+
+def load_flow(data) -> list:
+    """Replay input: a flow container, or the flow JSON as str or bytes."""
+    if is_flow_container(data):
+        return load_container(data)
+    return json.loads(data)
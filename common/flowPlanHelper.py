@@ -0,0 +1,123 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from common.flowFormatHelper import load_flow
+from common.templateHelper import compile_flow_templates
+from common.healingHelper import flow_fingerprint
+
+logger = logging.getLogger(__name__)
+
+STEP_KINDS = frozenset(("navigate", "uiaction", "gridextract", "loop", "counterloop", "dataloop", "gridloop"))
+PLAN_CACHE_SIZE = 32
+
+
+class FlowValidationError(ValueError):
+    pass
+
+
+class PlanStep:
+    """One step of a compiled flow with its children resolved; `step` is the recorded dict the helpers read."""
+
+    __slots__ = ("id", "kind", "label", "parent_id", "step", "children")
+
+    def __init__(self, step: dict, children: tuple):
+        self.id = step.get("id")
+        self.kind = (step.get("type") or "").lower()
+        self.label = step.get("label")
+        self.parent_id = step.get("parentId")
+        self.step = step
+        self.children = children
+
+    def __setattr__(self, name, value):
+        if hasattr(self, "children"):
+            raise AttributeError("PlanStep is immutable")
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"PlanStep({self.kind} {self.id!r}, {len(self.children)} children)"
+
+
+class FlowPlan:
+    """Validated, immutable execution plan for one flow; shared by every replay of the same flow."""
+
+    __slots__ = ("hash", "flow_id", "steps", "roots", "steps_by_id", "step_index", "templates", "warnings")
+
+    def __init__(self, flow_hash, flow, roots, steps_by_id, templates, warnings):
+        self.hash = flow_hash
+        self.flow_id = flow_fingerprint(flow)
+        self.steps = tuple(flow)
+        self.roots = roots
+        self.steps_by_id = steps_by_id
+        self.step_index = {step.get("id"): i for i, step in enumerate(flow)}
+        self.templates = templates
+        self.warnings = tuple(warnings)
+
+
+def compile_flow(flow: list, flow_hash=None) -> FlowPlan:
+    """Validates a flow and links each step to its children, ordered by timestamp."""
+    if not isinstance(flow, list):
+        raise FlowValidationError("flow must be a list of steps")
+
+    steps_by_id = {}
+    children_by_parent = {}
+    warnings = []
+    for i, step in enumerate(flow):
+        if not isinstance(step, dict):
+            raise FlowValidationError(f"step {i} is not an object")
+        step_id = step.get("id")
+        if step_id is not None:
+            if step_id in steps_by_id:
+                raise FlowValidationError(f"duplicate step id '{step_id}'")
+            steps_by_id[step_id] = step
+        if step.get("parentId"):
+            children_by_parent.setdefault(step["parentId"], []).append(step)
+
+    for parent_id, children in children_by_parent.items():
+        children.sort(key=lambda x: x.get("timestamp", 0))
+        if parent_id not in steps_by_id:
+            warnings.append(f"{len(children)} step(s) point at missing parent '{parent_id}' and will not run")
+
+    for step in flow:
+        kind = (step.get("type") or "").lower()
+        if kind not in STEP_KINDS:
+            warnings.append(f"step '{step.get('id')}' has unknown type '{step.get('type')}' and does nothing")
+        elif kind == "navigate" and not step.get("url"):
+            warnings.append(f"navigate step '{step.get('id')}' has no url")
+        elif kind in ("dataloop", "gridloop") and step.get("source") not in steps_by_id:
+            warnings.append(f"{step.get('type')} step '{step.get('id')}' reads missing source '{step.get('source')}'")
+
+    reached = set()
+
+    def build(step: dict) -> PlanStep:
+        reached.add(id(step))
+        children = tuple(build(child) for child in children_by_parent.get(step.get("id"), ()))
+        return PlanStep(step, children)
+
+    roots = tuple(build(step) for step in flow if not step.get("parentId"))
+    cyclic = [s.get("id") for s in flow if id(s) not in reached and s.get("parentId") in steps_by_id]
+    if cyclic:
+        warnings.append(f"steps {cyclic} are their own ancestors and will not run")
+    for warning in warnings:
+        logger.warning(f"[FlowPlan] {warning}")
+
+    return FlowPlan(flow_hash, flow, roots, steps_by_id, compile_flow_templates(flow), warnings)
+
+
+_plan_cache = OrderedDict()
+
+
+def get_flow_plan(flow_data) -> FlowPlan:
+    """Compiles flow JSON or a flow container, reusing the plan when the same flow was replayed recently."""
+    raw = flow_data.encode("utf-8") if isinstance(flow_data, str) else bytes(flow_data)
+    flow_hash = hashlib.sha1(raw).hexdigest()
+
+    plan = _plan_cache.get(flow_hash)
+    if plan is not None:
+        _plan_cache.move_to_end(flow_hash)
+        return plan
+
+    plan = compile_flow(load_flow(raw), flow_hash)
+    _plan_cache[flow_hash] = plan
+    if len(_plan_cache) > PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from playwright.async_api import Page, Frame
+
+logger = logging.getLogger(__name__)
+
+
+def get_frame_path(frame: Frame) -> list:
+    """Returns the name/url chain from the main frame down to `frame` (empty for the main frame)."""
+    path = []
+    while frame and frame.parent_frame:
+        path.insert(0, {"name": frame.name or "", "url": frame.url or ""})
+        frame = frame.parent_frame
+    return path
+
+
+def _same_document(url_a: str, url_b: str) -> bool:
+    a, b = urlsplit(url_a or ""), urlsplit(url_b or "")
+    return (a.scheme, a.netloc, a.path) == (b.scheme, b.netloc, b.path)
+
+
+def _match_child(parent: Frame, segment: dict):
+    children = parent.child_frames
+    name = segment.get("name")
+    url = segment.get("url")
+
+    if name:
+        named = [f for f in children if f.name == name]
+        if len(named) == 1:
+            return named[0]
+        children = named or children
+
+    exact = [f for f in children if f.url == url]
+    if exact:
+        return exact[0]
+
+    # Query strings often carry cache busters or session tokens
+    similar = [f for f in children if _same_document(f.url, url)]
+    return similar[0] if similar else None
+
+
+def resolve_frame(page: Page, frame_path: list):
+    """Walks a recorded frame path from the main frame; returns None if any hop is missing."""
+    frame = page.main_frame
+    for segment in frame_path or []:
+        frame = _match_child(frame, segment)
+        if not frame:
+            return None
+    return frame
+
+
+async def find_frames_with_matches(page: Page, locate, timeout: float = 2.0) -> list:
+    """Counts matches in every child frame concurrently under one shared deadline."""
+    frames = [f for f in page.frames if f != page.main_frame and not f.is_detached()]
+    if not frames:
+        return []
+
+    async def count(frame):
+        try:
+            return await locate(frame).count()
+        except Exception:
+            return 0
+
+    tasks = [asyncio.ensure_future(count(f)) for f in frames]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.info(f"[Frames] {len(pending)} of {len(frames)} frames did not answer within {timeout}s")
+
+    return [f for f, t in zip(frames, tasks) if t in done and t.result() > 0]
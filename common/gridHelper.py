@@ -158,6 +158,63 @@ async def infer_column_metadata(page, grid_selector: str):
 
     return headers, mappings
 
+# Same candidates handle_target_picked used to try one by one with locator waits
+PROBE_COLUMNS_SCRIPT = """
+({ rowSelector, columnCount, sampleRows }) => {
+  const rows = Array.from(document.querySelectorAll(rowSelector))
+    .filter(row => !row.querySelector("th, [role='columnheader']"))
+    .slice(0, sampleRows);
+
+  const isVisible = (el) => {
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== "hidden";
+  };
+
+  const columns = [];
+  for (let idx = 0; idx < columnCount; idx++) {
+    const patterns = [
+      `div[role='gridcell'][data-colindex='${idx}']`,
+      `[role='cell']:nth-child(${idx + 1})`,
+      `td:nth-of-type(${idx + 1})`,
+      `td:nth-of-type(${idx + 1}) input`,
+      `td:nth-of-type(${idx + 1}) div`,
+      `td:nth-of-type(${idx + 1}) *`
+    ];
+    let match = null;
+    for (const sel of patterns) {
+      for (const row of rows) {
+        const cell = row.querySelector(sel);
+        const text = cell && isVisible(cell) ? (cell.innerText || "").trim() : "";
+        if (text) {
+          match = { selector: sel, preview: cell.innerText };
+          break;
+        }
+      }
+      if (match) break;
+    }
+    columns.push({ columnIndex: idx, selector: match ? match.selector : "", preview: match ? match.preview : "" });
+  }
+  return { sampledRows: rows.length, columns };
+}
+"""
+
+async def probe_column_selectors(page, row_selector: str, column_count: int, sample_rows=5, retry_wait_ms=800):
+    """Finds a cell selector and preview for every column in one in-page pass over a few sample rows."""
+    args = {"rowSelector": row_selector, "columnCount": column_count, "sampleRows": sample_rows}
+    result = await page.evaluate(PROBE_COLUMNS_SCRIPT, args)
+
+    unresolved = [c for c in result["columns"] if not c["selector"]]
+    if unresolved or not result["sampledRows"]:
+        # Last resort: give late-rendering cells one short grace period, then probe again
+        await page.wait_for_timeout(retry_wait_ms)
+        retry = await page.evaluate(PROBE_COLUMNS_SCRIPT, args)
+        for idx, col in enumerate(result["columns"]):
+            if not col["selector"] and retry["columns"][idx]["selector"]:
+                result["columns"][idx] = retry["columns"][idx]
+        result["sampledRows"] = max(result["sampledRows"], retry["sampledRows"])
+
+    return result
+
 async def validate_selector(page, selector: str) -> bool:
     try:
         await page.wait_for_selector(selector, timeout=3000)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from playwright.async_api import Page
+from common.gridHelper import matches_filter
+from common.rowIndexHelper import ROW_INDEX_HELPER
+
+logger = logging.getLogger(__name__)
+
+STREAM_MODES = {"virtualized", "paginated"}
+
+# Reads every row currently rendered in one pass, keyed the same way as rowIndexHelper
+EXTRACT_RENDERED_ROWS = """
+(args) => {
+  %s
+  const { rowSelector, columns } = args;
+  const { indexId, keys } = window.__botflowsRows.index(rowSelector);
+  const map = window.__botflowsRows.maps[indexId];
+
+  const findCell = (row, col) => {
+    let cell = null;
+    if (col.selector) {
+      try { cell = row.querySelector(col.selector); } catch (e) { cell = null; }
+    }
+    if (!cell && col.columnIndex != null) {
+      cell = row.querySelector(`td:nth-of-type(${col.columnIndex + 1})`);
+    }
+    return cell;
+  };
+
+  const rows = keys.map((key) => {
+    const row = map.get(key);
+    const values = {};
+    for (const col of columns) {
+      const cell = findCell(row, col);
+      if (!cell) {
+        values[col.header] = null;
+      } else if (col.type === "img") {
+        values[col.header] = !!cell.querySelector("img");
+      } else {
+        values[col.header] = (cell.innerText || "").trim();
+      }
+    }
+    return { key, values };
+  });
+  return { indexId, rows };
+}
+""" % ROW_INDEX_HELPER
+
+# Scrolls the grid's virtual viewport (MUI DataGrid, ag-Grid, or the nearest scrollable box) by one page
+SCROLL_GRID_VIEWPORT = """
+(gridSelector) => {
+  const grid = document.querySelector(gridSelector);
+  if (!grid) return { moved: false, atEnd: true };
+
+  const isScrollable = (el) => {
+    if (!el || el.scrollHeight <= el.clientHeight + 1) return false;
+    const overflow = getComputedStyle(el).overflowY;
+    return overflow === "auto" || overflow === "scroll";
+  };
+
+  let viewport = grid.querySelector(".MuiDataGrid-virtualScroller, .ag-body-viewport, .ag-body-vertical-scroll-viewport");
+  if (!isScrollable(viewport)) {
+    viewport = isScrollable(grid) ? grid : Array.from(grid.querySelectorAll("*")).find(isScrollable);
+  }
+  if (!viewport) {
+    let el = grid.parentElement;
+    while (el && !isScrollable(el)) el = el.parentElement;
+    viewport = el || document.scrollingElement;
+  }
+
+  const before = viewport.scrollTop;
+  viewport.scrollTop = before + Math.max(viewport.clientHeight * 0.9, 50);
+  const moved = viewport.scrollTop > before;
+  return { moved, atEnd: viewport.scrollTop + viewport.clientHeight >= viewport.scrollHeight - 2 };
+}
+"""
+
+
+def _column_specs(column_mappings: list):
+    specs = []
+    for col in column_mappings:
+        header_obj = col.get("header", {})
+        specs.append({
+            "header": header_obj.get("header", f"col_{col.get('columnIndex')}"),
+            "type": header_obj.get("type", "text"),
+            "selector": col.get("selector") or "",
+            "columnIndex": col.get("columnIndex"),
+        })
+    return specs
+
+
+async def _go_to_next_page(page: Page, next_page_selector: str, row_selector: str, previous_keys: list, timeout_ms=5000) -> bool:
+    button = page.locator(next_page_selector).first
+    try:
+        if await button.count() == 0 or not await button.is_enabled():
+            return False
+        if (await button.get_attribute("aria-disabled")) == "true":
+            return False
+        await button.click(timeout=timeout_ms)
+    except Exception as ex:
+        logger.info(f"[Grid Stream] Next page not available: {ex}")
+        return False
+
+    # Wait for the rendered rows to change rather than for a fixed delay
+    deadline = asyncio.get_running_loop().time() + timeout_ms / 1000
+    while asyncio.get_running_loop().time() < deadline:
+        result = await page.evaluate(EXTRACT_RENDERED_ROWS, {"rowSelector": row_selector, "columns": []})
+        if [r["key"] for r in result["rows"]] != previous_keys:
+            return True
+        await asyncio.sleep(0.1)
+    logger.warning("[Grid Stream] Rows did not change after next page click")
+    return False
+
+
+async def stream_grid_rows(page: Page, grid_selector: str, row_selector: str, column_mappings: list,
+                           filters=None, mode="virtualized", next_page_selector=None,
+                           batch_size=100, settle_ms=150, max_idle_rounds=3):
+    """Yields batches of {"key", "indexId", "data"} as a virtualized or paginated grid is walked."""
+    filters = filters or []
+    columns = _column_specs(column_mappings)
+    type_map = {c["header"]: c["type"] for c in columns}
+    seen = set()
+    batch = []
+    page_number = 0
+    idle_rounds = 0
+
+    await page.wait_for_selector(grid_selector, state="visible", timeout=5000)
+    await page.wait_for_selector(row_selector, state="attached", timeout=5000)
+
+    while True:
+        result = await page.evaluate(EXTRACT_RENDERED_ROWS, {"rowSelector": row_selector, "columns": columns})
+        index_id = result["indexId"]
+        rendered_keys = [r["key"] for r in result["rows"]]
+        new_rows = 0
+
+        for row in result["rows"]:
+            key = row["key"]
+            # Positional keys restart on every page, so scope them to the page they came from
+            dedup_key = f"{page_number}/{key}" if mode == "paginated" and not key.startswith("id-") else key
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
+            new_rows += 1
+
+            row_data = row["values"]
+            if all(v in [None, ""] for v in row_data.values()):
+                continue
+            if not all(matches_filter(row_data, f, type_map.get(f.get("column"), "text")) for f in filters):
+                continue
+
+            batch.append({"key": key, "indexId": index_id, "data": row_data})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            # Hand over what is rendered now, before scrolling or paging unmounts it
+            yield batch
+            batch = []
+
+        if mode == "paginated":
+            if not next_page_selector or not await _go_to_next_page(page, next_page_selector, row_selector, rendered_keys):
+                break
+            page_number += 1
+            continue
+
+        scroll = await page.evaluate(SCROLL_GRID_VIEWPORT, grid_selector)
+        await asyncio.sleep(settle_ms / 1000)
+        idle_rounds = idle_rounds + 1 if new_rows == 0 else 0
+        # A scroll that moved gets one more read so rows rendered by the last page are not lost
+        if (not scroll["moved"] and new_rows == 0) or idle_rounds >= max_idle_rounds:
+            break
+
+    logger.info(f"[Grid Stream] Finished after {len(seen)} unique rows ({page_number + 1} page(s))")
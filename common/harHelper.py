@@ -0,0 +1,68 @@
+import re
+import time
+import logging
+from pathlib import Path
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+HAR_DIR = Path("recordings") / "har"
+_HAR_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,120}$")
+
+
+class HarMiss(Exception):
+    pass
+
+
+def har_path(name: str) -> Path:
+    """Archive path for a name; names only, so API callers can't point at arbitrary files."""
+    if not name or not _HAR_NAME.match(name) or name.startswith("."):
+        raise ValueError(f"invalid HAR name '{name}'")
+    return HAR_DIR / f"{name}.har.zip"
+
+
+def new_har_name(url: str) -> str:
+    host = re.sub(r"[^A-Za-z0-9.-]", "_", urlsplit(url).hostname or "session")
+    return f"{host}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def har_record_options(name: str) -> dict:
+    """new_context options that capture the session's traffic, bodies included, to the named archive."""
+    path = har_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # minimal keeps only what route_from_har needs to match and answer requests
+    return {"record_har_path": str(path), "record_har_mode": "minimal", "record_har_content": "attach"}
+
+
+class HarReplay:
+    """Serves a replay's requests from a recorded archive; strict mode aborts and reports anything not in it."""
+
+    def __init__(self, name: str, strict=False):
+        self.name = name
+        self.path = har_path(name)
+        self.strict = strict
+        self.misses = []
+
+    async def attach(self, context):
+        if not self.path.exists():
+            raise FileNotFoundError(f"HAR archive '{self.name}' not found")
+
+        async def unmatched(route):
+            # Only reached when the archive had no entry for the request
+            request = route.request
+            if self.strict:
+                self.misses.append(f"{request.method} {request.url}")
+                logger.warning(f"[HAR] Not in archive, aborted: {request.method} {request.url}")
+                await route.abort()
+            else:
+                await route.fallback()
+
+        # Routes run newest first: the archive answers, misses fall through to `unmatched`
+        await context.route("**/*", unmatched)
+        await context.route_from_har(str(self.path), not_found="fallback")
+        logger.info(f"[HAR] Serving responses from {self.path}{' (strict)' if self.strict else ''}")
+
+    def check(self):
+        if self.strict and self.misses:
+            shown = ", ".join(self.misses[:5])
+            raise HarMiss(f"{len(self.misses)} request(s) not in HAR '{self.name}': {shown}")
@@ -0,0 +1,158 @@
+import re
+import copy
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+HEALING_DB_PATH = Path("recordings") / "selector_healing.db"
+# A success adds 1 up to MAX_SCORE; a failure halves the score, so a selector that starts failing drops out fast
+MAX_SCORE = 5.0
+MIN_SCORE = 0.5
+FAILURE_DECAY = 0.5
+# Unused healed selectors fade out after this long
+STALE_AFTER_SECONDS = 30 * 24 * 3600
+
+_DYNAMIC_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{16,}|[0-9a-fA-F]{24})$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS healed_selectors (
+    flow_id TEXT NOT NULL,
+    step_id TEXT NOT NULL,
+    url_pattern TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    source TEXT,
+    original_selector TEXT,
+    score REAL NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_success REAL,
+    last_failure REAL,
+    PRIMARY KEY (flow_id, step_id, url_pattern, selector)
+)
+"""
+
+
+def url_pattern(url: str) -> str:
+    """Host and path with ids masked, so /orders/123 and /orders/456 share healed selectors."""
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    segments = ["*" if _DYNAMIC_SEGMENT.match(seg) else seg for seg in parts.path.split("/")]
+    return f"{parts.netloc}{'/'.join(segments)}"
+
+
+def flow_fingerprint(flow: list) -> str:
+    """Flow JSON has no id of its own; the recorded step ids are stable across runs of the same flow."""
+    explicit = next((s.get("flowId") for s in flow if s.get("flowId")), None)
+    if explicit:
+        return str(explicit)
+    ids = "|".join(str(s.get("id")) for s in flow)
+    return hashlib.sha1(ids.encode("utf-8")).hexdigest()[:16]
+
+
+class HealingStore:
+    """Selectors that recovered a step, scored per flow, step and URL pattern."""
+
+    def __init__(self, path=HEALING_DB_PATH):
+        self.path = Path(path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # WAL lets replay worker processes write while others read
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def best(self, flow_id: str, step_id, url: str, limit=3) -> list:
+        """Healed selectors worth trying first, best score first."""
+        try:
+            with self._lock:
+                rows = self._db().execute(
+                    """SELECT selector, source, score FROM healed_selectors
+                       WHERE flow_id = ? AND step_id = ? AND url_pattern = ? AND score >= ? AND last_success >= ?
+                       ORDER BY score DESC, last_success DESC LIMIT ?""",
+                    (flow_id, str(step_id), url_pattern(url), MIN_SCORE, time.time() - STALE_AFTER_SECONDS, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"[Healing] Lookup failed: {e}")
+            return []
+        return [{"selector": selector, "source": source or "healed", "score": score} for selector, source, score in rows]
+
+    def record_success(self, flow_id: str, step_id, url: str, selector: str, source="", original_selector=None):
+        now = time.time()
+        self._write(
+            """INSERT INTO healed_selectors
+                   (flow_id, step_id, url_pattern, selector, source, original_selector, score, successes, last_success)
+               VALUES (?, ?, ?, ?, ?, ?, 1, 1, ?)
+               ON CONFLICT (flow_id, step_id, url_pattern, selector) DO UPDATE SET
+                   score = MIN(score + 1, ?), successes = successes + 1, last_success = excluded.last_success""",
+            (flow_id, str(step_id), url_pattern(url), selector, source, original_selector, now, MAX_SCORE)
+        )
+
+    def record_failure(self, flow_id: str, step_id, url: str, selector: str):
+        self._write(
+            """UPDATE healed_selectors SET score = score * ?, failures = failures + 1, last_failure = ?
+               WHERE flow_id = ? AND step_id = ? AND url_pattern = ? AND selector = ?""",
+            (FAILURE_DECAY, time.time(), flow_id, str(step_id), url_pattern(url), selector)
+        )
+
+    def _write(self, sql: str, params: tuple):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute(sql, params)
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[Healing] Write failed: {e}")
+
+    def best_per_step(self, flow_id: str) -> dict:
+        """Top selector for each step of a flow across URL patterns, for exporting."""
+        with self._lock:
+            rows = self._db().execute(
+                """SELECT step_id, selector, source, score FROM healed_selectors
+                   WHERE flow_id = ? AND score >= ? ORDER BY score DESC, last_success DESC""",
+                (flow_id, MIN_SCORE)
+            ).fetchall()
+        best = {}
+        for step_id, selector, source, score in rows:
+            best.setdefault(step_id, {"selector": selector, "source": source or "healed", "score": score})
+        return best
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+healing_store = HealingStore()
+
+
+def export_healed_flow(flow: list, store: HealingStore, flow_id=None) -> tuple:
+    """Copy of the flow with each healed selector promoted to the step's first choice; returns (flow, patched count)."""
+    flow_id = flow_id or flow_fingerprint(flow)
+    best = store.best_per_step(flow_id)
+    patched = copy.deepcopy(flow)
+    count = 0
+    for step in patched:
+        healed = best.get(str(step.get("id")))
+        if not healed or healed["selector"] == step.get("selector"):
+            continue
+        others = [s for s in step.get("selectors") or []
+                  if (s.get("selector") if isinstance(s, dict) else s) != healed["selector"]]
+        step["selectors"] = [{"selector": healed["selector"], "source": healed["source"]}] + others
+        step["selector"] = healed["selector"]
+        count += 1
+    return patched, count
+
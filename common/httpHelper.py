@@ -0,0 +1,158 @@
+import time
+import random
+import asyncio
+import logging
+import httpx
+from config import API_BASE_URL, API_KEY, API_TIMEOUT_SECONDS, API_RETRIES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  httpx only speaks HTTP/2 when h2 is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# Retryable for any call: the backend never saw the request, or refused it before doing anything
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+REJECTED_STATUS_CODES = {429}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Fails calls fast after repeated backend failures, then lets one probe through after a cool-down."""
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        # The probe ended without an outcome (cancelled, or an unexpected error): let the next call probe
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"[HTTP] Circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class ApiClient:
+    """One pooled keep-alive client for the Botflows backend, with retries and a circuit breaker."""
+
+    def __init__(self, base_url=API_BASE_URL, api_key=API_KEY, timeout=API_TIMEOUT_SECONDS, retries=API_RETRIES,
+                 backoff=0.25, max_backoff=4.0, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._loop = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # An httpx client is bound to the loop that opened its connections
+        if self._client is not None and self._loop is not loop:
+            self._discard(self._client, self._loop)
+            self._client = None
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-api-key": self.api_key},
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30),
+                http2=HTTP2_AVAILABLE,
+            )
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    def _discard(client: httpx.AsyncClient, loop):
+        if client.is_closed:
+            return
+        if loop is not None and loop.is_running():
+            # Still serving another thread: its pool is closed there
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            # A closed loop can't run the close handshake; dropping the last reference closes the sockets
+            logger.debug("[HTTP] Dropping the client of a finished event loop")
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter keeps parallel replay workers from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    async def post(self, path: str, json=None, timeout=None, retries=None, idempotent=False) -> httpx.Response:
+        """POSTs to the backend. Only `idempotent` calls are retried after the request may have been processed
+        (read timeouts, 502/504); others, like uploads and confirmations, only when it never got there."""
+        probe = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            raise CircuitOpen(f"backend unavailable, skipping {path}")
+
+        retries = self.retries if retries is None else retries
+        try:
+            client = self._get_client()
+            for attempt in range(retries + 1):
+                try:
+                    response = await client.post(path, json=json, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                except httpx.TransportError as ex:
+                    self.breaker.record_failure()
+                    if (attempt >= retries or not (idempotent or isinstance(ex, UNSENT_ERRORS))
+                            or not self.breaker.allow()):
+                        raise
+                    logger.info(f"[HTTP] {path} failed ({ex.__class__.__name__}), retry {attempt + 1}/{retries}")
+                else:
+                    if response.status_code < 500 and response.status_code != 429:
+                        self.breaker.record_success()
+                        return response
+                    self.breaker.record_failure()
+                    retryable = RETRY_STATUS_CODES if idempotent else REJECTED_STATUS_CODES
+                    if response.status_code not in retryable or attempt >= retries or not self.breaker.allow():
+                        return response
+                    logger.info(f"[HTTP] {path} returned {response.status_code}, retry {attempt + 1}/{retries}")
+                await asyncio.sleep(self._delay(attempt))
+        finally:
+            # A cancelled probe records nothing; without this the breaker would never let another call through
+            if probe:
+                self.breaker.release_probe()
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+api_client = ApiClient()
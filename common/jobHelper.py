@@ -0,0 +1,167 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict
+import psutil
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+# Rough resident size of one Chromium with a couple of tabs
+BROWSER_MEMORY_MB = 600
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def default_concurrency(browser_memory_mb=BROWSER_MEMORY_MB) -> int:
+    """Concurrent browser jobs this machine can take: half the cores, capped by free memory."""
+    cores = os.cpu_count() or 1
+    try:
+        memory_slots = psutil.virtual_memory().available // (browser_memory_mb * 1024 * 1024)
+    except Exception:
+        memory_slots = cores
+    return max(1, min(max(1, cores // 2), int(memory_slots)))
+
+
+class Job:
+    __slots__ = ("id", "kind", "priority", "payload", "run", "status", "created", "started", "finished", "error",
+                 "result", "task", "done")
+
+    def __init__(self, kind, run, priority=0, payload=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.priority = priority
+        self.payload = payload or {}
+        self.run = run
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = None
+        self.task = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def as_dict(self, include_result=True) -> dict:
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            **self.payload,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """Bounded priority queue of browser jobs run by a fixed number of workers.
+
+    `dedicated` maps a job kind to workers of its own, outside `concurrency`: a recording holds its worker for the
+    whole session, and must not take the slot a preview replay needs.
+    """
+
+    def __init__(self, concurrency=None, max_queued=50, history=200, dedicated=None):
+        self.concurrency = concurrency or default_concurrency()
+        self.dedicated = dict(dedicated or {})
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs = OrderedDict()
+        self._queues = {}
+        self._workers = []
+        self._sequence = itertools.count()
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        self._queues[None] = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker(i, self._queues[None])) for i in range(self.concurrency)]
+        for kind, count in self.dedicated.items():
+            self._queues[kind] = asyncio.PriorityQueue()
+            self._workers += [asyncio.create_task(self._worker(f"{kind}-{i}", self._queues[kind]))
+                              for i in range(count)]
+        logger.info(f"[Jobs] Started {self.concurrency} job worker(s)"
+                    + "".join(f", {count} for {kind}" for kind, count in self.dedicated.items()))
+
+    def queued_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def active(self, kind: str):
+        return [job for job in self.jobs.values() if job.kind == kind and job.status in (QUEUED, RUNNING)]
+
+    def submit(self, kind: str, run, priority=0, payload=None) -> Job:
+        """Queues `run` (a coroutine function) and returns its job; higher priority runs first."""
+        self._ensure_workers()
+        if self.queued_count() >= self.max_queued:
+            raise JobQueueFull(f"{self.max_queued} jobs already queued")
+
+        job = Job(kind, run, priority, payload)
+        self.jobs[job.id] = job
+        self._queues.get(kind, self._queues[None]).put_nowait((-priority, next(self._sequence), job))
+        self._trim_history()
+        logger.info(f"[Jobs] Queued {kind} job {job.id} (priority {priority}, {self.queued_count()} waiting)")
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return False
+        if job.status == QUEUED:
+            # Left in the heap; the worker that pops it skips it
+            self._finish(job, CANCELLED)
+        elif job.task:
+            job.task.cancel()
+        return True
+
+    async def _worker(self, worker_id, queue):
+        while True:
+            _, _, job = await queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started = time.time()
+                logger.info(f"[Jobs] Worker {worker_id} running {job.kind} job {job.id}")
+                job.task = asyncio.create_task(job.run())
+                try:
+                    result = await job.task
+                    self._finish(job, SUCCEEDED, result=result)
+                except asyncio.CancelledError:
+                    if not job.task.cancelled():
+                        raise  # the worker itself is shutting down
+                    self._finish(job, CANCELLED)
+                except Exception as ex:
+                    logger.exception(f"[Jobs] {job.kind} job {job.id} failed")
+                    self._finish(job, FAILED, error=str(ex))
+            finally:
+                queue.task_done()
+
+    def _finish(self, job: Job, status: str, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        job.task = None
+        if not job.done.done():
+            job.done.set_result(job)
+        logger.info(f"[Jobs] {job.kind} job {job.id} {status}")
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
@@ -0,0 +1,119 @@
+import sys
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Hot paths stay at INFO unless BOTFLOWS_LOG_LEVELS turns them up
+DEFAULT_MODULE_LEVELS = {
+    "botflows-player": "INFO",
+    "recorder.recorder": "INFO",
+    "common.gridStreamHelper": "INFO",
+    "uvicorn.access": "WARNING",
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "asyncio": "WARNING",
+}
+
+_listener = None
+
+
+def parse_module_levels(spec: str) -> dict:
+    """Parses "name=LEVEL,other=LEVEL" into a dict; malformed entries are ignored."""
+    levels = {}
+    for part in (spec or "").split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """Formats on the calling thread but caps the message, so large event bodies never reach the queue."""
+
+    def __init__(self, log_queue, max_length=2000):
+        super().__init__(log_queue)
+        self.max_length = max_length
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            # Tracebacks are appended by the base class after this, so they are never cut
+            record = copy.copy(record)
+            record.msg = f"{message[:self.max_length]}... [{len(message) - self.max_length} chars truncated]"
+            record.args = None
+        return super().prepare(record)
+
+
+class CallSiteSampler(logging.Filter):
+    """Lets at most `per_second` sub-WARNING records through per call site and reports what was dropped."""
+
+    def __init__(self, per_second=20):
+        super().__init__()
+        self.per_second = per_second
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.per_second:
+            return True
+
+        key = (record.name, record.lineno)
+        now = int(time.monotonic())
+        with self._lock:
+            window = self._windows.get(key)
+            if not window or window[0] != now:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (+{suppressed} similar suppressed)"
+                return True
+            if window[1] < self.per_second:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def configure_logging(log_path, level=logging.DEBUG, module_levels=None, max_bytes=5 * 1024 * 1024,
+                      backup_count=5, max_message_length=2000, sample_per_second=20):
+    """Routes all logging through a queue so file and console writes happen off the event loop."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+        # Closed, not just detached: an open handle on the old file blocks rollover on Windows
+        for handler in _listener.handlers:
+            handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = TruncatingQueueHandler(log_queue, max_message_length)
+    queue_handler.addFilter(CallSiteSampler(sample_per_second))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    levels.update(module_levels or {})
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,165 @@
+import time
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn):
+        """Reads the value at scrape time instead of on every change."""
+        self._function = fn
+
+    def render(self) -> list:
+        if self._function:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition (format 0.0.4) for every registered metric."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Agent metrics ---
+
+REPLAY_STEP_SECONDS = Histogram(
+    "botflows_replay_step_seconds", "Wall time of one replayed step.", ("type", "status"))
+SELECTOR_ATTEMPTS = Counter(
+    "botflows_selector_attempts_total", "try_action attempts by how the selector was found and whether it worked.",
+    ("kind", "source", "outcome"))
+GRID_ROWS_EXTRACTED = Counter(
+    "botflows_grid_rows_extracted_total", "Grid rows read during extraction.", ("mode",))
+GRID_EXTRACT_SECONDS = Histogram(
+    "botflows_grid_extract_seconds", "Time spent reading grid rows in one extraction.", ("mode",))
+GRID_ROWS_PER_SECOND = Histogram(
+    "botflows_grid_rows_per_second", "Rows read per second by one grid extraction.", ("mode",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+EVENT_QUEUE_DEPTH = Gauge(
+    "botflows_event_queue_depth", "Recorded events waiting for the standard event worker.")
+WS_BROADCAST_LAG_SECONDS = Histogram(
+    "botflows_ws_broadcast_lag_seconds", "Delay from an event being captured in the page to its websocket broadcast.")
+SNAPSHOT_UPLOAD_BYTES = Histogram(
+    "botflows_snapshot_upload_bytes", "Size of uploaded DOM snapshots.",
+    buckets=(10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000))
+SNAPSHOT_UPLOAD_SECONDS = Histogram(
+    "botflows_snapshot_upload_seconds", "DOM snapshot upload latency.", ("outcome",))
+BROWSER_LAUNCH_SECONDS = Histogram(
+    "botflows_browser_launch_seconds", "Time to launch or attach to the browser.", ("mode",))
+
+
+def observe_grid_extraction(mode: str, rows: int, seconds: float):
+    GRID_ROWS_EXTRACTED.inc(rows, mode=mode)
+    GRID_EXTRACT_SECONDS.observe(seconds, mode=mode)
+    if seconds > 0 and rows:
+        GRID_ROWS_PER_SECOND.observe(rows / seconds, mode=mode)
@@ -0,0 +1,150 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Recorded actions that can start a navigation
+NAVIGATING_ACTIONS = {"click", "dblclick"}
+# A main-frame navigation starting this soon after a click, with no other action in between, is taken to be its doing
+NAVIGATION_WINDOW_SECONDS = 2.0
+# The page counts as settled once the DOM and the network have been quiet this long
+QUIET_MS = 250
+
+DOM_QUIET_SCRIPT = """
+([quietMs, maxMs]) => new Promise(resolve => {
+  let timer;
+  const observer = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(done, quietMs); });
+  function done() { observer.disconnect(); resolve(true); }
+  observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+  timer = setTimeout(done, quietMs);
+  setTimeout(() => { observer.disconnect(); resolve(false); }, maxMs);
+})
+"""
+
+
+class NavigationMarker:
+    """Recorder side: flags the latest click-like event when the main frame starts navigating right after it."""
+
+    def __init__(self, window_seconds=NAVIGATION_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._last = None
+        self._last_at = 0.0
+        self._settled = None
+
+    def note(self, event):
+        # Any later action closes the previous click's window: "click box, type, press Enter" is not the click's doing
+        self._close()
+        if (event.action or "").lower() in NAVIGATING_ACTIONS:
+            # Known not to navigate until the page says otherwise
+            event.navigates = False
+            self._last, self._last_at = event, time.monotonic()
+            self._settled = asyncio.Event()
+
+    def navigated(self):
+        """The event that caused the navigation, or None when nothing was clicked recently."""
+        event = self._last
+        if event is None or time.monotonic() - self._last_at > self.window_seconds:
+            return None
+        event.navigates = True
+        self._close()
+        return event
+
+    async def settled(self, event):
+        """Waits until the event's flag is final: it navigated, another action followed, or its window ran out."""
+        if event is not self._last:
+            return
+        settled = self._settled
+        remaining = self.window_seconds - (time.monotonic() - self._last_at)
+        try:
+            await asyncio.wait_for(settled.wait(), max(0.0, remaining))
+        except asyncio.TimeoutError:
+            pass
+
+    def _close(self):
+        self._last = None
+        if self._settled:
+            self._settled.set()
+            self._settled = None
+
+    def reset(self):
+        self._close()
+
+
+class NavigationWatch:
+    """Player side: listens from before an action on, so a navigation it starts is never missed."""
+
+    def __init__(self, page):
+        self.page = page
+        self.inflight = 0
+        self.quiet_since = time.monotonic()
+        loop = asyncio.get_running_loop()
+        self.requested = loop.create_future()
+        self.committed = loop.create_future()
+
+    def __enter__(self):
+        self.page.on("request", self._on_request)
+        self.page.on("requestfinished", self._on_request_done)
+        self.page.on("requestfailed", self._on_request_done)
+        self.page.on("framenavigated", self._on_navigated)
+        return self
+
+    def __exit__(self, *exc):
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("requestfinished", self._on_request_done)
+        self.page.remove_listener("requestfailed", self._on_request_done)
+        self.page.remove_listener("framenavigated", self._on_navigated)
+
+    def _on_request(self, request):
+        self.inflight += 1
+        if request.is_navigation_request() and request.frame == self.page.main_frame and not self.requested.done():
+            self.requested.set_result(request.url)
+
+    def _on_request_done(self, request):
+        self.inflight = max(0, self.inflight - 1)
+        if not self.inflight:
+            self.quiet_since = time.monotonic()
+
+    def _on_navigated(self, frame):
+        if frame == self.page.main_frame:
+            # Same-document (history API) navigations commit without a request
+            for future in (self.requested, self.committed):
+                if not future.done():
+                    future.set_result(frame.url)
+
+    async def _network_quiet(self):
+        while self.inflight or time.monotonic() - self.quiet_since < QUIET_MS / 1000:
+            await asyncio.sleep(0.05)
+
+    async def _dom_quiet(self, max_ms):
+        try:
+            await self.page.evaluate(DOM_QUIET_SCRIPT, [QUIET_MS, max_ms])
+        except Exception:
+            # The document went away under the observer: a navigation, which `requested` reports
+            await asyncio.sleep(max_ms / 1000)
+
+    async def _quiet(self, max_ms):
+        await self._dom_quiet(max_ms)
+        await self._network_quiet()
+
+    async def settle(self, grace_seconds: float, timeout_ms: int) -> bool:
+        """Waits out the action: through the load if it navigated within the grace window, otherwise until
+        the DOM and network go quiet or the window ends. Returns whether it navigated."""
+        settled = asyncio.ensure_future(self._quiet(int(grace_seconds * 1000)))
+        try:
+            done, _ = await asyncio.wait({self.requested, settled}, timeout=grace_seconds,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            settled.cancel()
+        if self.requested not in done:
+            return False
+
+        logger.info(f"[Navigation] Action navigated to {self.requested.result()}, waiting for load")
+        try:
+            await asyncio.wait_for(asyncio.shield(self.committed), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            # Downloads and aborted requests never commit
+            logger.warning("[Navigation] Navigation request never committed")
+            return False
+        await self.page.wait_for_load_state("load", timeout=timeout_ms)
+        return True
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import importlib
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET = "recorder.player:replay_flow"
+CANCEL_GRACE_SECONDS = 30
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+def _load_target(target: str):
+    module_name, _, func_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _worker_main(conn, worker_id: int, log_path: str, target: str):
+    """Entry point of a worker process: its own event loop and Playwright, one job at a time."""
+    if log_path:
+        from common.logHelper import configure_logging
+        configure_logging(f"{log_path}.worker-{worker_id}")
+    asyncio.run(_worker_loop(conn, worker_id, _load_target(target)))
+
+
+async def _worker_loop(conn, worker_id: int, run):
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    # Pipes can't be awaited on Windows, so one thread owns recv and feeds the loop
+    def reader():
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = ("stop",)
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    threading.Thread(target=reader, daemon=True).start()
+    logger.info(f"[Worker {worker_id}] Ready")
+
+    while True:
+        message = await inbox.get()
+        if message[0] == "stop":
+            return
+        if message[0] != "run":
+            continue
+
+        task = asyncio.create_task(run(*message[1]))
+        while not task.done():
+            waiter = asyncio.create_task(inbox.get())
+            done, _ = await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if waiter not in done:
+                waiter.cancel()
+                break
+            control = waiter.result()
+            if control[0] in ("cancel", "stop"):
+                task.cancel()
+            if control[0] == "stop":
+                inbox.put_nowait(control)
+
+        try:
+            conn.send(("result", task.result()))
+        except asyncio.CancelledError:
+            conn.send(("cancelled", None))
+        except Exception as ex:
+            logger.exception(f"[Worker {worker_id}] Job failed")
+            conn.send(("error", str(ex)))
+
+
+class _Worker:
+    __slots__ = ("id", "process", "conn")
+
+    def __init__(self, worker_id, process, conn):
+        self.id = worker_id
+        self.process = process
+        self.conn = conn
+
+
+class ReplayProcessPool:
+    """Runs replays in long-lived subprocesses; the API process only dispatches and collects results."""
+
+    def __init__(self, processes: int, log_path=None, target=DEFAULT_TARGET):
+        self.processes = processes
+        self.log_path = str(log_path) if log_path else None
+        self.target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = None
+        self._workers = {}
+
+    def _spawn(self, worker_id: int) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, worker_id, self.log_path, self.target),
+            name=f"botflows-replay-{worker_id}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(worker_id, process, parent_conn)
+        self._workers[worker_id] = worker
+        logger.info(f"[ProcessPool] Started worker {worker_id} (pid {process.pid})")
+        return worker
+
+    def _ensure_started(self):
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for worker_id in range(self.processes):
+            self._idle.put_nowait(self._spawn(worker_id))
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.conn.close()
+        return self._spawn(worker.id)
+
+    async def run(self, *args):
+        """Runs one job on the next idle worker; cancelling the caller cancels the job in the worker."""
+        self._ensure_started()
+        worker = await self._idle.get()
+        try:
+            worker.conn.send(("run", args))
+            reply = asyncio.ensure_future(asyncio.to_thread(worker.conn.recv))
+            try:
+                kind, data = await asyncio.shield(reply)
+            except asyncio.CancelledError:
+                worker.conn.send(("cancel",))
+                try:
+                    await asyncio.wait_for(reply, timeout=CANCEL_GRACE_SECONDS)
+                except Exception:
+                    logger.warning(f"[ProcessPool] Worker {worker.id} ignored cancel, restarting it")
+                    worker = self._replace(worker)
+                raise
+        except (EOFError, OSError) as ex:
+            logger.error(f"[ProcessPool] Worker {worker.id} died: {ex}")
+            worker = self._replace(worker)
+            raise WorkerCrashed(f"replay worker {worker.id} exited unexpectedly") from ex
+        finally:
+            self._idle.put_nowait(worker)
+
+        if kind == "error":
+            raise Exception(data)
+        if kind == "cancelled":
+            raise asyncio.CancelledError()
+        return data
+
+    def shutdown(self):
+        for worker in self._workers.values():
+            try:
+                worker.conn.send(("stop",))
+            except Exception:
+                pass
+        for worker in self._workers.values():
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._workers.clear()
+        self._idle = None
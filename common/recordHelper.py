@@ -0,0 +1,70 @@
+import sys
+import hashlib
+
+# Short strings that repeat on nearly every event
+_INTERNED = ("action", "url", "tagName", "selector", "domPath", "xpath", "name", "id")
+# Fields the recorder script always sends; the rest are only serialized when set
+_ALWAYS = ("action", "url", "value", "timestamp", "tagName", "id", "name", "classList", "attributes", "text",
+           "elementText", "boundingBox", "outerHTML", "selector", "domPath", "xpath")
+_OPTIONAL = ("framePath", "dynamicValue", "transformType", "transform", "mappedScope", "viewport", "navigates")
+
+
+class BlobStore:
+    """Keeps one copy of each large string; the focus, click and change events of one element share its outerHTML."""
+
+    __slots__ = ("_blobs", "min_size")
+
+    def __init__(self, min_size=256):
+        self._blobs = {}
+        self.min_size = min_size
+
+    def share(self, value):
+        if not isinstance(value, str) or len(value) < self.min_size:
+            return value
+        key = hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return self._blobs.setdefault(key, value)
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def clear(self):
+        self._blobs.clear()
+
+
+class EventRecord:
+    """One recorded UI event; unknown keys sent by the page are kept in `extra`."""
+
+    __slots__ = _ALWAYS + _OPTIONAL + ("extra",)
+
+    def __init__(self, **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, fields.pop(slot, None))
+        if fields:
+            self.extra = {**(self.extra or {}), **fields}
+
+    @classmethod
+    def from_event(cls, event: dict, blobs: BlobStore = None, frame_path=None) -> "EventRecord":
+        fields = dict(event)
+        for key in _INTERNED:
+            value = fields.get(key)
+            if isinstance(value, str) and len(value) < 512:
+                fields[key] = sys.intern(value)
+        if blobs is not None:
+            fields["outerHTML"] = blobs.share(fields.get("outerHTML"))
+        if isinstance(fields.get("classList"), list):
+            fields["classList"] = tuple(sys.intern(c) for c in fields["classList"])
+        if frame_path is not None:
+            fields["framePath"] = frame_path
+        return cls(**fields)
+
+    def to_dict(self) -> dict:
+        data = {slot: getattr(self, slot) for slot in _ALWAYS}
+        if self.classList is not None:
+            data["classList"] = list(self.classList)
+        for slot in _OPTIONAL:
+            value = getattr(self, slot)
+            if value is not None:
+                data[slot] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
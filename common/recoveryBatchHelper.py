@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from common.httpHelper import api_client, CircuitOpen
+from common.selectorHelper import convert_keys_to_pascal, confirm_selector_worked
+from common.flowFormatHelper import hydrate
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path("recordings") / "selector_recovery_cache.json"
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+RESOLVE_PATH = "/api/selectoranalysis/resolve"
+RESOLVE_BATCH_PATH = "/api/selectoranalysis/resolve-batch"
+# How long a finished replay waits for its selector confirmations to reach the backend
+CONFIRM_WAIT_SECONDS = 10
+
+# Fields that identify the recorded element; volatile ones (timestamps, bounding boxes) are left out
+_FINGERPRINT_FIELDS = ("action", "tagName", "selector", "xpath", "domPath", "framePath")
+_FINGERPRINT_ATTRIBUTES = ("id", "name", "type", "role", "aria-label", "placeholder", "href", "data-testid")
+# Large fields the resolver does not need
+_PAYLOAD_DROP = ("outerHTML", "boundingBox", "selectors")
+
+
+def step_fingerprint(step: dict) -> str:
+    attributes = step.get("attributes") or {}
+    text = " ".join((step.get("elementText") or step.get("innerText") or "").split())[:200]
+    key = {
+        **{f: step.get(f) for f in _FINGERPRINT_FIELDS},
+        "attributes": {a: attributes.get(a) for a in _FINGERPRINT_ATTRIBUTES if attributes.get(a)},
+        "classList": sorted(step.get("classList") or []),
+        "text": text,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class RecoveryCache:
+    """Resolved selectors on disk, keyed by step fingerprint."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL_SECONDS):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        try:
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception as e:
+            logger.warning(f"[RecoveryCache] Ignoring unreadable cache {self.path}: {e}")
+            self._entries = {}
+
+    def get(self, fingerprint: str, allow_stale=False):
+        self._load()
+        entry = self._entries.get(fingerprint)
+        if not entry:
+            return None
+        if not allow_stale and time.time() - entry.get("resolvedAt", 0) > self.ttl:
+            return None
+        return entry.get("selectors", [])
+
+    def put(self, fingerprint: str, selectors: list):
+        self._load()
+        self._entries[fingerprint] = {"selectors": selectors, "resolvedAt": time.time()}
+        self._dirty = True
+
+    def promote(self, fingerprint: str, selector: str):
+        """Moves a selector that just worked to the front so the next run tries it first."""
+        self._load()
+        entry = self._entries.get(fingerprint)
+        if not entry:
+            return
+        selectors = entry.get("selectors", [])
+        for i, candidate in enumerate(selectors):
+            if candidate.get("selector") == selector and i > 0:
+                selectors.insert(0, selectors.pop(i))
+                self._dirty = True
+                break
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._entries), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"[RecoveryCache] Could not save {self.path}: {e}")
+
+
+class SelectorRecoveryClient:
+    """Resolves broken steps of one flow through the backend in windows, backed by the disk cache."""
+
+    def __init__(self, flow: list, cache: RecoveryCache = None, window=25, concurrency=4):
+        self.steps = [s for s in flow if (s.get("type") or "").lower() == "uiaction"]
+        self.cache = cache or RecoveryCache()
+        self.window = window
+        self.concurrency = concurrency
+        # Computed on demand: only steps that go into recovery need one, and innerText is a cold field
+        self.fingerprints = {}
+        self._inflight = {}
+        self._batch_supported = True
+        self._confirmations = set()
+        self.api_calls = 0
+
+    def fingerprint(self, step: dict) -> str:
+        fingerprint = self.fingerprints.get(id(step))
+        if fingerprint is None:
+            fingerprint = self.fingerprints[id(step)] = step_fingerprint(step)
+        return fingerprint
+
+    async def resolve(self, step: dict) -> list:
+        fingerprint = self.fingerprint(step)
+        cached = self.cache.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(fingerprint)
+        if future is None:
+            window = self._window_from(step)
+            future = asyncio.ensure_future(self._resolve_window(window))
+            fingerprints = [self.fingerprint(s) for s in window]
+            for fp in fingerprints:
+                self._inflight[fp] = future
+            future.add_done_callback(lambda done: self._forget(fingerprints, done))
+        # Shared by every step of the window: a step whose budget runs out must not cancel the others' request
+        await asyncio.shield(future)
+
+        selectors = self.cache.get(fingerprint)
+        if selectors is None:
+            # Backend unreachable: an expired entry beats nothing
+            selectors = self.cache.get(fingerprint, allow_stale=True) or []
+        return selectors
+
+    def _forget(self, fingerprints: list, future):
+        # Finished or cancelled windows are dropped, so a later failure of the same step asks again
+        for fp in fingerprints:
+            if self._inflight.get(fp) is future:
+                del self._inflight[fp]
+
+    async def prefetch(self):
+        """Resolves every uncached step of the flow up front, one window per request."""
+        pending = [s for s in self.steps if self.cache.get(self.fingerprint(s)) is None]
+        for start in range(0, len(pending), self.window):
+            await self._resolve_window(pending[start:start + self.window])
+
+    def confirm(self, step: dict, selector: str):
+        self.cache.promote(self.fingerprint(step), selector)
+
+    def report_healed(self, flow_id, step_index, original_selector: str, selector: str):
+        """Tells the backend a selector healed a step without holding up the replay; aclose waits for it."""
+        task = asyncio.create_task(confirm_selector_worked(flow_id, step_index, original_selector, selector))
+        self._confirmations.add(task)
+        task.add_done_callback(self._confirmed)
+
+    def _confirmed(self, task):
+        self._confirmations.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"[Recovery] Confirming a healed selector failed: {task.exception()}")
+
+    async def aclose(self, wait=True):
+        """Saves the cache and settles pending confirmations: waited for, or cancelled along with the replay."""
+        self.cache.save()
+        pending = list(self._confirmations)
+        if not pending:
+            return
+        if not wait:
+            for task in pending:
+                task.cancel()
+        await asyncio.wait(pending, timeout=CONFIRM_WAIT_SECONDS)
+
+    def _window_from(self, step: dict) -> list:
+        """The failing step plus the next uncached steps after it, which tend to break together."""
+        window = [step]
+        try:
+            start = next(i for i, s in enumerate(self.steps) if s is step) + 1
+        except StopIteration:
+            return window
+        for s in self.steps[start:]:
+            if len(window) >= self.window:
+                break
+            fingerprint = self.fingerprint(s)
+            if fingerprint not in self._inflight and self.cache.get(fingerprint) is None:
+                window.append(s)
+        return window
+
+    def _payload(self, step: dict) -> dict:
+        return convert_keys_to_pascal({k: v for k, v in hydrate(step).items() if k not in _PAYLOAD_DROP})
+
+    async def _resolve_window(self, steps: list):
+        try:
+            if self._batch_supported:
+                resolved = await self._post_batch(steps)
+            else:
+                resolved = await self._post_each(steps)
+        except CircuitOpen as e:
+            logger.info(f"[Recovery] {e}; using cached selectors only")
+            return
+        except Exception as e:
+            logger.warning(f"[Recovery] Resolve failed for {len(steps)} step(s): {e}")
+            return
+
+        for step, selectors in zip(steps, resolved):
+            if selectors is not None:
+                self.cache.put(self.fingerprint(step), selectors)
+        self.cache.save()
+
+    async def _post_batch(self, steps: list) -> list:
+        payload = {"Steps": [{**self._payload(s), "Fingerprint": self.fingerprint(s)} for s in steps]}
+        self.api_calls += 1
+        res = await api_client.post(RESOLVE_BATCH_PATH, json=payload, idempotent=True)
+        if res.status_code in (404, 405):
+            logger.info("[Recovery] Backend has no batch resolve endpoint, falling back to per-step calls")
+            self._batch_supported = False
+            return await self._post_each(steps)
+        if res.status_code != 200:
+            raise Exception(f"batch resolve returned {res.status_code}")
+
+        results = res.json().get("results", [])
+        by_fingerprint = {r.get("fingerprint"): r.get("selectors", []) for r in results if r.get("fingerprint")}
+        if by_fingerprint:
+            return [by_fingerprint.get(self.fingerprint(s)) for s in steps]
+        return [r.get("selectors", []) for r in results] + [None] * (len(steps) - len(results))
+
+    async def _post_each(self, steps: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(step):
+            async with semaphore:
+                self.api_calls += 1
+                res = await api_client.post(RESOLVE_PATH, json=self._payload(step), idempotent=True)
+                return res.json().get("selectors", []) if res.status_code == 200 else None
+
+        return await asyncio.gather(*(one(s) for s in steps))
@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from common.agentConfigHelper import agent_config
+
+logger = logging.getLogger(__name__)
+
+# Built-in profiles; agent_config "replay_profiles" can override or add to them
+REPLAY_PROFILES = {
+    "default": {},
+    "unattended": {
+        "headless": True,
+        "block_resource_types": ["image", "font", "media"],
+        "block_domains": ["google-analytics.com", "googletagmanager.com", "doubleclick.net", "facebook.net",
+                          "hotjar.com", "segment.io", "clarity.ms"],
+        "reduce_motion": True,
+    },
+}
+
+# Recorded boxes only line up when the replay lays the page out at the recorded size
+DEFAULT_VIEWPORT = {"width": 1366, "height": 768}
+
+REDUCED_MOTION_CSS = """
+(() => {
+  const apply = () => {
+    const style = document.createElement('style');
+    style.id = '__botflows_reduced_motion';
+    style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; scroll-behavior: auto !important; caret-color: auto !important; }';
+    (document.head || document.documentElement).appendChild(style);
+  };
+  if (document.documentElement) apply(); else document.addEventListener('DOMContentLoaded', apply);
+})();
+"""
+
+
+class ReplayProfile:
+    __slots__ = ("name", "headless", "block_resource_types", "block_domains", "reduce_motion")
+
+    def __init__(self, name, headless=False, block_resource_types=(), block_domains=(), reduce_motion=False):
+        self.name = name
+        self.headless = bool(headless)
+        self.block_resource_types = frozenset(block_resource_types)
+        self.block_domains = tuple(d.lower().lstrip(".") for d in block_domains)
+        self.reduce_motion = bool(reduce_motion)
+
+    @property
+    def active(self) -> bool:
+        return self.headless or bool(self.block_resource_types or self.block_domains) or self.reduce_motion
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.block_resource_types:
+            return True
+        if self.block_domains:
+            host = (urlsplit(url).hostname or "").lower()
+            return any(host == d or host.endswith("." + d) for d in self.block_domains)
+        return False
+
+    def context_options(self, viewport=None) -> dict:
+        options = {"viewport": viewport or DEFAULT_VIEWPORT}
+        if self.reduce_motion:
+            options["reduced_motion"] = "reduce"
+        return options
+
+
+def get_replay_profile(name=None) -> ReplayProfile:
+    name = name or "default"
+    profiles = {**REPLAY_PROFILES, **(agent_config.get().get("replay_profiles") or {})}
+    settings = profiles.get(name)
+    if settings is None:
+        logger.warning(f"[Profile] Unknown replay profile '{name}', using default")
+        name, settings = "default", {}
+    return ReplayProfile(name, **settings)
+
+
+def recorded_viewport(steps) -> dict:
+    """Viewport the flow was recorded at, taken from the first step that carries one."""
+    return next((s.get("viewport") for s in steps if s.get("viewport")), None)
+
+
+class NetworkStats:
+    """Requests, blocked requests and response bytes of one replay."""
+
+    __slots__ = ("requests", "blocked", "bytes", "_pending")
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+        self._pending = set()
+
+    def attach(self, context):
+        context.on("requestfinished", self._on_finished)
+
+    def _on_finished(self, request):
+        task = asyncio.ensure_future(self._add_size(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _add_size(self, request):
+        self.requests += 1
+        try:
+            sizes = await request.sizes()
+            self.bytes += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+        except Exception:
+            pass
+
+    async def settle(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def as_dict(self) -> dict:
+        return {"requests": self.requests, "blocked": self.blocked, "bytes": self.bytes}
+
+
+async def new_profile_context(browser, profile: ReplayProfile, viewport=None, stats: NetworkStats = None):
+    """Browser context set up for a replay profile: fixed viewport, blocked resources, no animations."""
+    context = await browser.new_context(**profile.context_options(viewport))
+
+    if profile.block_resource_types or profile.block_domains:
+        async def route_request(route):
+            request = route.request
+            if profile.blocks(request.resource_type, request.url):
+                if stats:
+                    stats.blocked += 1
+                await route.abort()
+            else:
+                await route.fallback()
+
+        await context.route("**/*", route_request)
+
+    if profile.reduce_motion:
+        await context.add_init_script(REDUCED_MOTION_CSS)
+    if stats:
+        stats.attach(context)
+    return context
+
+
+def replay_summary(started: float, stats: NetworkStats, profile: ReplayProfile) -> dict:
+    return {"profile": profile.name, "wallSeconds": round(time.perf_counter() - started, 3), **stats.as_dict()}
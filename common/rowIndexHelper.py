@@ -0,0 +1,124 @@
+import logging
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+ROW_ENGINE_NAME = "botflowsrow"
+
+# Installs window.__botflowsRows: one Map per row selector from a stable row key to its element.
+# Keys prefer row ids (MUI data-id, ag-Grid row-id), then row indexes (data-rowindex,
+# aria-rowindex), then a hash of the row text. A miss on a re-rendered grid rebuilds the map.
+ROW_INDEX_HELPER = """
+if (!window.__botflowsRows) {
+  const hashText = (text) => {
+    let h = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) {
+      h ^= text.charCodeAt(i);
+      h = Math.imul(h, 0x01000193) >>> 0;
+    }
+    return h.toString(16);
+  };
+
+  const keyOf = (row) => {
+    const id = row.getAttribute('data-id') || row.getAttribute('row-id') || row.getAttribute('data-row-id') || row.id;
+    if (id) return 'id-' + encodeURIComponent(id);
+    const idx = row.getAttribute('data-rowindex') ?? row.getAttribute('row-index') ?? row.getAttribute('aria-rowindex');
+    if (idx != null) return 'idx-' + encodeURIComponent(idx);
+    return 'hash-' + hashText((row.innerText || row.textContent || '').trim());
+  };
+
+  window.__botflowsRows = {
+    selectors: [],
+    maps: [],
+    keyOf,
+
+    index(rowSelector) {
+      let id = this.selectors.indexOf(rowSelector);
+      if (id < 0) {
+        id = this.selectors.push(rowSelector) - 1;
+      }
+      const map = new Map();
+      const keys = [];
+      for (const row of document.querySelectorAll(rowSelector)) {
+        const base = keyOf(row);
+        let key = base;
+        // Identical rows hashing to the same key keep their relative order
+        for (let n = 2; map.has(key); n++) key = base + '~' + n;
+        map.set(key, row);
+        keys.push(key);
+      }
+      this.maps[id] = map;
+      return { indexId: id, keys };
+    },
+
+    get(indexId, key) {
+      const map = this.maps[indexId];
+      if (!map) return null;
+      let el = map.get(key);
+      if (!el || !el.isConnected) {
+        this.index(this.selectors[indexId]);
+        el = this.maps[indexId].get(key);
+      }
+      return el && el.isConnected ? el : null;
+    }
+  };
+}
+"""
+
+ROW_SELECTOR_ENGINE = """
+(() => {
+  %s
+  const lookup = (root, body) => {
+    const sep = body.indexOf(':');
+    const el = window.__botflowsRows.get(Number(body.slice(0, sep)), body.slice(sep + 1));
+    return el && (root === document || root.contains(el)) ? el : null;
+  };
+  return {
+    query(root, body) { return lookup(root, body); },
+    queryAll(root, body) { const el = lookup(root, body); return el ? [el] : []; }
+  };
+})()
+""" % ROW_INDEX_HELPER
+
+
+async def register_row_engine(playwright) -> bool:
+    try:
+        await playwright.selectors.register(ROW_ENGINE_NAME, ROW_SELECTOR_ENGINE)
+        return True
+    except Exception as e:
+        # Registering twice on the same Playwright instance raises; the engine is still usable
+        if "already registered" in str(e):
+            return True
+        logger.warning(f"[RowIndex] Could not register row selector engine: {e}")
+        return False
+
+
+async def index_rows(page: Page, row_selector: str):
+    """Captures a stable key for every row currently matching row_selector."""
+    result = await page.evaluate(
+        "(rowSelector) => {" + ROW_INDEX_HELPER + " return window.__botflowsRows.index(rowSelector); }",
+        row_selector
+    )
+    return result["indexId"], result["keys"]
+
+
+def row_key_locator(page: Page, index_id: int, key: str):
+    return page.locator(f"{ROW_ENGINE_NAME}={index_id}:{key}")
+
+
+async def resync_rows(page: Page, cached: dict) -> bool:
+    """Re-indexes a cached grid after it mutated and rebuilds its row locators by key."""
+    row_selector = cached.get("rowSelector")
+    keys = cached.get("rowKeys")
+    if not row_selector or not keys:
+        return False
+
+    index_id, current_keys = await index_rows(page, row_selector)
+    present = set(current_keys)
+    missing = [k for k in keys if k not in present]
+    if missing:
+        logger.warning(f"[RowIndex] {len(missing)} of {len(keys)} rows no longer present after re-sync")
+
+    cached["rowIndexId"] = index_id
+    cached["rows"] = [row_key_locator(page, index_id, k) for k in keys]
+    return not missing
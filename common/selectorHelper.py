@@ -1,10 +1,10 @@
 import re
 import os
-import httpx
 from typing import Optional, Tuple
 from datetime import datetime
 from bs4 import BeautifulSoup
 from common import state
+from common.httpHelper import api_client
 
 async def get_devtools_like_selector(el):
     path = []
@@ -216,45 +216,32 @@ def convert_keys_to_pascal(obj):
 
 async def call_selector_recovery_api(step: dict) -> list[dict]:
     payload = convert_keys_to_pascal(step)
-    headers = {
-        "Content-Type": "application/json",
-        "x-api-key": "u42Q7gXgVx8fN1rLk9eJ0cGm5wYzA2dR"
-    }
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            base_url = os.getenv("BOTFLOWS_API_BASE_URL", "http://localhost:5000")
-            res = await client.post(f"{base_url}/api/selectoranalysis/resolve", json=payload, headers=headers)
-            if res.status_code == 200:
-                return res.json().get("selectors", [])
-            print(f"Recovery API failed: {res.status_code} => {res.text}")
+        res = await api_client.post("/api/selectoranalysis/resolve", json=payload, idempotent=True)
+        if res.status_code == 200:
+            return res.json().get("selectors", [])
+        print(f"Recovery API failed: {res.status_code} => {res.text}")
     except Exception as ex:
         print(f"Selector recovery failed: {ex}")
     
     return []
 
 async def confirm_selector_worked(flow_id, step_index, original_selector, improved_selector):
-    headers = {
-        "Content-Type": "application/json",
-        # "x-api-key": os.getenv("BOTFLOWS_API_KEY", "")
-        "x-api-key": "u42Q7gXgVx8fN1rLk9eJ0cGm5wYzA2dR"
-    }
     try:
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
-                f"{os.getenv('BOTFLOWS_API_BASE', 'http://localhost:5000')}/api/selectoranalysis/confirm",
-                json={
-                    "flowId": flow_id,
-                    "stepIndex": step_index,
-                    "originalSelector": original_selector,
-                    "improvedSelector": improved_selector
-                },
-                timeout=10, headers=headers
-            )
-            if res.status_code == 200:
-                print("Confirmation sent and flow updated.")
-            else:
-                print(f"Confirm failed: {res.status_code} - {res.text}")
+        res = await api_client.post(
+            "/api/selectoranalysis/confirm",
+            json={
+                "flowId": flow_id,
+                "stepIndex": step_index,
+                "originalSelector": original_selector,
+                "improvedSelector": improved_selector
+            }
+        )
+        if res.status_code == 200:
+            print("Confirmation sent and flow updated.")
+        else:
+            print(f"Confirm failed: {res.status_code} - {res.text}")
     except Exception as e:
         print(f"Error confirming selector: {e}")
 
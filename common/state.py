@@ -3,6 +3,8 @@
 is_recording = False
 is_running = False
 is_replaying = False
+# In-process replays running now; is_replaying stays true until the last one ends
+active_replays = 0
 current_url = None
 active_page = None
 active_dom_snapshot = None
@@ -0,0 +1,95 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(.*?)\}\}")
+LOOP_STEP_TYPES = {"dataloop", "gridloop"}
+
+
+class CompiledTemplate:
+    """A `{{column}}` template split into literal segments and the columns between them."""
+
+    __slots__ = ("source", "literals", "columns", "placeholders")
+
+    def __init__(self, source, literals, columns, placeholders):
+        self.source = source
+        self.literals = literals
+        self.columns = columns
+        self.placeholders = placeholders
+
+    def render(self, row_data: dict, convert=None) -> str:
+        parts = [self.literals[0]]
+        for column, placeholder, literal in zip(self.columns, self.placeholders, self.literals[1:]):
+            if column in row_data:
+                val = row_data[column]
+                if convert:
+                    val = convert(val)
+                parts.append("" if val is None else str(val))
+            else:
+                # Unknown columns are left untouched, same as the old str.replace loop
+                parts.append(placeholder)
+            parts.append(literal)
+        return "".join(parts)
+
+
+def compile_template(source: str) -> CompiledTemplate:
+    literals = []
+    columns = []
+    placeholders = []
+    pos = 0
+    for match in PLACEHOLDER_PATTERN.finditer(source):
+        literals.append(source[pos:match.start()])
+        columns.append(match.group(1).strip())
+        placeholders.append(match.group(0))
+        pos = match.end()
+    literals.append(source[pos:])
+    return CompiledTemplate(source, tuple(literals), tuple(columns), tuple(placeholders))
+
+
+def get_source_columns(step: dict, steps_by_id: dict):
+    """Returns the column names available to a step from its closest data loop, or None if unknown."""
+    parent = steps_by_id.get(step.get("parentId"))
+    while parent:
+        if (parent.get("type") or "").lower() in LOOP_STEP_TYPES:
+            extract = steps_by_id.get(parent.get("source"))
+            if not extract:
+                return None
+            columns = set()
+            for col in extract.get("columnMappings", []):
+                header = col.get("header", {})
+                # Same key extract_grid_data gives the column, col_N when the mapping has no header
+                if isinstance(header, dict):
+                    header = header.get("header", f"col_{col.get('columnIndex')}")
+                columns.add(header)
+            return columns
+        parent = steps_by_id.get(parent.get("parentId"))
+    return None
+
+
+def compile_flow_templates(flow: list) -> dict:
+    """Compiles every dynamicValue in the flow once and reports placeholders no data source provides."""
+    steps_by_id = {step["id"]: step for step in flow if "id" in step}
+    templates = {}
+
+    for step in flow:
+        dynamic_value = step.get("dynamicValue")
+        if not isinstance(dynamic_value, str) or "{{" not in dynamic_value:
+            continue
+
+        template = compile_template(dynamic_value)
+        templates[step.get("id")] = template
+
+        known = get_source_columns(step, steps_by_id)
+        if known is None:
+            logger.warning(f"[Template] Step '{step.get('id')}' uses {dynamic_value} outside of a data loop")
+            continue
+
+        unknown = [c for c in template.columns if c not in known]
+        if unknown:
+            logger.error(
+                f"[Template] Step '{step.get('id')}' references unknown column(s) {unknown}; "
+                f"available: {sorted(c for c in known if c)}"
+            )
+
+    return templates
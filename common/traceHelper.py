@@ -0,0 +1,258 @@
+import json
+import time
+import uuid
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import TRACE_KEEP_RUNS, TRACE_KEEP_DAYS
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = Path("recordings") / "traces"
+
+current_step_trace = ContextVar("botflows_step_trace", default=None)
+
+
+class AttemptTrace:
+    """One try_action call: which selector ran where, and how long it waited vs acted."""
+
+    __slots__ = ("selector", "kind", "source", "frame", "matches", "retries", "wait_ms", "action_ms", "ok", "error",
+                 "_started")
+
+    def __init__(self, selector, kind, source, frame=None):
+        self.selector = selector
+        self.kind = kind
+        self.source = source
+        self.frame = frame
+        self.matches = None
+        self.retries = 0
+        self.wait_ms = None
+        self.action_ms = 0.0
+        self.ok = False
+        self.error = None
+        self._started = time.monotonic()
+
+    def located(self, matches: int):
+        self.matches = matches
+
+    def ready(self, retries: int):
+        """Marks the end of locating and actionability checks; what follows is the action itself."""
+        self.retries = retries
+        self.wait_ms = (time.monotonic() - self._started) * 1000
+
+    def finish(self, error=None):
+        total = (time.monotonic() - self._started) * 1000
+        if self.wait_ms is None:
+            self.wait_ms = total
+        self.action_ms = total - self.wait_ms
+        self.ok = error is None
+        self.error = str(error)[:300] if error else None
+
+    def as_dict(self) -> dict:
+        return {
+            "selector": self.selector,
+            "kind": self.kind,
+            "source": self.source,
+            "frame": self.frame,
+            "matches": self.matches,
+            "retries": self.retries,
+            "waitMs": round(self.wait_ms or 0, 1),
+            "actionMs": round(self.action_ms, 1),
+            "ok": self.ok,
+            "error": self.error,
+        }
+
+
+class StepTrace:
+    __slots__ = ("step_id", "step_type", "label", "stack", "row_index", "started", "attempts", "status")
+
+    def __init__(self, step: dict, parent=None, row_index=None):
+        self.step_id = step.get("id")
+        self.step_type = step.get("type")
+        self.label = step.get("label") or step.get("name")
+        self.stack = (parent.stack if parent else ()) + (str(self.step_id),)
+        self.row_index = row_index
+        self.started = time.monotonic()
+        self.attempts = []
+        self.status = None
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+    def outcome(self) -> str:
+        if self.status:
+            return self.status
+        return "failed" if self.attempts and not any(a.ok for a in self.attempts) else "ok"
+
+
+def prune_traces(trace_dir: Path = TRACE_DIR, keep_runs=TRACE_KEEP_RUNS, keep_days=TRACE_KEEP_DAYS) -> int:
+    """Deletes traces beyond the newest `keep_runs` and those older than `keep_days`; returns how many went."""
+    # Run ids start with the start time, so reverse name order is newest first
+    files = sorted(Path(trace_dir).glob("*.jsonl"), reverse=True)
+    expired = files[keep_runs:] if keep_runs > 0 else []
+    if keep_days > 0:
+        cutoff = time.time() - keep_days * 24 * 3600
+        for path in files[:len(files) - len(expired)]:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    expired.append(path)
+            except OSError:
+                pass
+    removed = 0
+    for path in expired:
+        try:
+            path.unlink()
+            removed += 1
+        except OSError as e:
+            logger.debug(f"[Trace] Could not remove {path}: {e}")
+    if removed:
+        logger.info(f"[Trace] Pruned {removed} old replay trace(s)")
+    return removed
+
+
+class ReplayTrace:
+    """Writes one JSONL record per finished step of a replay_flow run."""
+
+    def __init__(self, trace_dir: Path = TRACE_DIR, keep_runs=TRACE_KEEP_RUNS, keep_days=TRACE_KEEP_DAYS):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.path = Path(trace_dir) / f"{self.run_id}.jsonl"
+        self.started = time.monotonic()
+        self._file = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Room for this run within the newest keep_runs
+            prune_traces(trace_dir, keep_runs - 1 if keep_runs > 0 else 0, keep_days)
+            self._file = open(self.path, "w", encoding="utf-8")
+        except Exception as e:
+            logger.warning(f"[Trace] Could not open {self.path}: {e}")
+
+    def write(self, record: dict):
+        if not self._file:
+            return
+        self._file.write(json.dumps(record) + "\n")
+
+    def start(self, step_count: int):
+        self.write({"kind": "run", "runId": self.run_id, "startedAt": time.time(), "steps": step_count})
+
+    def step_finished(self, step_trace: StepTrace):
+        self.write({
+            "kind": "step",
+            "runId": self.run_id,
+            "stepId": step_trace.step_id,
+            "type": step_trace.step_type,
+            "label": step_trace.label,
+            "stack": list(step_trace.stack),
+            "rowIndex": step_trace.row_index,
+            "offsetMs": round((step_trace.started - self.started) * 1000, 1),
+            "elapsedMs": round(step_trace.elapsed_ms(), 1),
+            "status": step_trace.outcome(),
+            "attempts": [a.as_dict() for a in step_trace.attempts],
+        })
+
+    def close(self, status="ok"):
+        self.write({"kind": "end", "runId": self.run_id, "elapsedMs": round((time.monotonic() - self.started) * 1000, 1),
+                    "status": status})
+        if self._file:
+            self._file.close()
+            self._file = None
+        logger.info(f"[Trace] Replay trace written to {self.path}")
+
+
+@contextmanager
+def trace_step(trace, step: dict, row_index=None):
+    step_trace = StepTrace(step, current_step_trace.get(), row_index)
+    token = current_step_trace.set(step_trace)
+    try:
+        yield step_trace
+    except BaseException:
+        step_trace.status = step_trace.status or "error"
+        raise
+    finally:
+        current_step_trace.reset(token)
+        if trace:
+            trace.step_finished(step_trace)
+
+
+@contextmanager
+def trace_attempt(selector, kind, source=None, frame=None):
+    attempt = AttemptTrace(selector, kind, source, frame)
+    step_trace = current_step_trace.get()
+    if step_trace:
+        step_trace.attempts.append(attempt)
+    try:
+        yield attempt
+    except BaseException as e:
+        attempt.finish(e if isinstance(e, Exception) else "cancelled")
+        raise
+    attempt.finish()
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def summarize_traces(trace_dir: Path = TRACE_DIR, limit=200) -> dict:
+    """Aggregates the latest `limit` runs into per-step totals and folded flame-graph stacks."""
+    files = sorted(Path(trace_dir).glob("*.jsonl"), reverse=True)[:limit]
+    steps = {}
+    folded = {}
+
+    for path in files:
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except Exception as e:
+            logger.warning(f"[Trace] Could not read {path}: {e}")
+            continue
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a run that crashed mid-write leaves a partial last line
+            if record.get("kind") != "step":
+                continue
+
+            entry = steps.setdefault(record["stepId"], {
+                "stepId": record["stepId"], "type": record.get("type"), "label": record.get("label"),
+                "durations": [], "waitMs": 0.0, "actionMs": 0.0, "retries": 0, "failures": 0, "sources": {},
+            })
+            entry["durations"].append(record["elapsedMs"])
+            if record.get("status") != "ok":
+                entry["failures"] += 1
+            for attempt in record.get("attempts", []):
+                entry["waitMs"] += attempt.get("waitMs", 0)
+                entry["actionMs"] += attempt.get("actionMs", 0)
+                entry["retries"] += attempt.get("retries", 0)
+                if attempt.get("ok"):
+                    entry["sources"][attempt["kind"]] = entry["sources"].get(attempt["kind"], 0) + 1
+
+            # Folded stacks count self time only so parents are not double counted by the flame graph
+            stack = ";".join(record.get("stack") or [str(record["stepId"])])
+            folded[stack] = folded.get(stack, 0.0) + record["elapsedMs"]
+            parent = ";".join((record.get("stack") or [])[:-1])
+            if parent:
+                folded[parent] = folded.get(parent, 0.0) - record["elapsedMs"]
+
+    rows = []
+    for entry in steps.values():
+        durations = entry.pop("durations")
+        entry.update({
+            "count": len(durations),
+            "totalMs": round(sum(durations), 1),
+            "meanMs": round(sum(durations) / len(durations), 1),
+            "p95Ms": round(_percentile(durations, 0.95), 1),
+            "waitMs": round(entry["waitMs"], 1),
+            "actionMs": round(entry["actionMs"], 1),
+        })
+        rows.append(entry)
+    rows.sort(key=lambda r: -r["totalMs"])
+
+    return {
+        "runs": len(files),
+        "steps": rows,
+        "folded": [f"{stack} {max(0, int(ms))}" for stack, ms in sorted(folded.items())],
+    }
@@ -0,0 +1,246 @@
+import re
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+_METHOD_CALL = re.compile(r"\s*\.\s*([A-Za-z]+)\s*\(")
+_JS_REPLACEMENT_TOKEN = re.compile(r"\$(\$|&|\d{1,2})")
+_REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}
+
+
+@lru_cache(maxsize=512)
+def compile_regex(pattern: str, flags: int = 0):
+    return re.compile(pattern, flags)
+
+
+class CompiledTransform:
+    """A step's transform parsed once into a chain of callables."""
+
+    __slots__ = ("transform_type", "transform", "ops")
+
+    def __init__(self, transform_type, transform, ops):
+        self.transform_type = transform_type
+        self.transform = transform
+        self.ops = ops
+
+    def __call__(self, value):
+        if not self.ops or not value:
+            return value
+        result = value
+        try:
+            for op in self.ops:
+                result = op(result)
+            return result
+        except Exception as e:
+            logger.warning(f"[Transform Apply Error] {e}")
+            return "(error)" if self.transform_type == "regex" else value
+
+    def apply_many(self, values):
+        if not self.ops:
+            return list(values)
+        return [self(v) for v in values]
+
+
+IDENTITY_TRANSFORM = CompiledTransform(None, None, ())
+
+
+@lru_cache(maxsize=256)
+def compile_transform(transform_type: str, transform: str) -> CompiledTransform:
+    if not transform_type or not transform:
+        return IDENTITY_TRANSFORM
+
+    try:
+        if transform_type == "regex":
+            ops = (_regex_extract(compile_regex(transform)),)
+        elif transform_type == "js":
+            ops = tuple(_parse_js_chain(transform))
+        else:
+            logger.info(f"[Transform Compile] Unknown transform type: {transform_type}")
+            return IDENTITY_TRANSFORM
+    except Exception as e:
+        logger.warning(f"[Transform Compile Error] {transform_type} '{transform}': {e}")
+        if transform_type == "regex":
+            return CompiledTransform(transform_type, transform, (_constant("(error)"),))
+        return IDENTITY_TRANSFORM
+
+    logger.info(f"[Transform Compile] {transform_type}: {transform} ({len(ops)} op(s))")
+    return CompiledTransform(transform_type, transform, ops)
+
+
+def _constant(result):
+    return lambda value: result
+
+
+def _regex_extract(re_obj):
+    def extract(value):
+        match = re_obj.search(value)
+        if not match:
+            return "(no match)"
+        return match.group(1) if match.lastindex else match.group(0)
+    return extract
+
+
+# --- JS-like expression parsing: value.trim().slice(0, 3).replace(/a/g, 'b') ---
+
+def _parse_js_chain(expr: str):
+    expr = expr.strip()
+    if expr.startswith("value"):
+        expr = expr[len("value"):]
+
+    ops = []
+    pos = 0
+    while pos < len(expr):
+        if not expr[pos:].strip():
+            break
+        match = _METHOD_CALL.match(expr, pos)
+        if not match:
+            raise ValueError(f"unsupported syntax at '{expr[pos:]}'")
+        args, pos = _parse_args(expr, match.end())
+        ops.append(_make_op(match.group(1), args))
+    return ops
+
+
+def _parse_args(expr: str, pos: int):
+    args = []
+    while True:
+        while pos < len(expr) and expr[pos].isspace():
+            pos += 1
+        if pos >= len(expr):
+            raise ValueError("unterminated call")
+
+        ch = expr[pos]
+        if ch == ")" and not args:
+            return args, pos + 1
+        if ch == "/":
+            arg, pos = _read_regex_literal(expr, pos)
+        elif ch in "'\"`":
+            arg, pos = _read_string_literal(expr, pos)
+        else:
+            end = pos
+            while end < len(expr) and expr[end] not in ",)":
+                end += 1
+            arg, pos = int(expr[pos:end].strip()), end
+        args.append(arg)
+
+        while pos < len(expr) and expr[pos].isspace():
+            pos += 1
+        if pos >= len(expr):
+            raise ValueError("unterminated call")
+        if expr[pos] == ")":
+            return args, pos + 1
+        if expr[pos] != ",":
+            raise ValueError(f"unexpected '{expr[pos]}'")
+        pos += 1
+
+
+def _read_regex_literal(expr: str, pos: int):
+    i = pos + 1
+    in_class = False
+    while i < len(expr):
+        ch = expr[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            break
+        i += 1
+    else:
+        raise ValueError("unterminated regex literal")
+
+    pattern = expr[pos + 1:i]
+    i += 1
+    flags_start = i
+    while i < len(expr) and expr[i].isalpha():
+        i += 1
+    return ("regex", pattern, expr[flags_start:i]), i
+
+
+def _read_string_literal(expr: str, pos: int):
+    quote = expr[pos]
+    chars = []
+    i = pos + 1
+    while i < len(expr):
+        ch = expr[i]
+        if ch == "\\" and i + 1 < len(expr):
+            chars.append(expr[i + 1])
+            i += 2
+            continue
+        if ch == quote:
+            return "".join(chars), i + 1
+        chars.append(ch)
+        i += 1
+    raise ValueError("unterminated string literal")
+
+
+def _js_substring(value, start, end=None):
+    length = len(value)
+    start = min(max(start, 0), length)
+    end = length if end is None else min(max(end, 0), length)
+    if start > end:
+        start, end = end, start
+    return value[start:end]
+
+
+def _js_replacement(repl: str):
+    """Converts a JS replacement string ($1, $&, $$) into a re.sub callable."""
+    def expand(match):
+        def token(m):
+            key = m.group(1)
+            if key == "$":
+                return "$"
+            if key == "&":
+                return match.group(0)
+            index = int(key)
+            if 0 < index <= (match.re.groups or 0):
+                return match.group(index) or ""
+            return m.group(0)
+        return _JS_REPLACEMENT_TOKEN.sub(token, repl)
+    return expand
+
+
+def _make_replace(args, replace_all: bool):
+    if len(args) != 2 or not isinstance(args[1], str):
+        raise ValueError("replace expects (pattern, 'replacement')")
+    pattern, repl = args
+
+    if isinstance(pattern, tuple):
+        _, source, flags = pattern
+        re_flags = 0
+        for flag in flags:
+            re_flags |= _REGEX_FLAGS.get(flag, 0)
+        re_obj = compile_regex(source, re_flags)
+        count = 0 if replace_all or "g" in flags else 1
+        expand = _js_replacement(repl)
+        return lambda value: re_obj.sub(expand, value, count=count)
+
+    if replace_all:
+        return lambda value: value.replace(pattern, repl)
+    return lambda value: value.replace(pattern, repl, 1)
+
+
+def _make_op(name: str, args: list):
+    if name == "trim" and not args:
+        return str.strip
+    if name == "trimStart" and not args:
+        return str.lstrip
+    if name == "trimEnd" and not args:
+        return str.rstrip
+    if name == "toLowerCase" and not args:
+        return str.lower
+    if name == "toUpperCase" and not args:
+        return str.upper
+    if name == "slice" and 1 <= len(args) <= 2:
+        start, end = args[0], args[1] if len(args) == 2 else None
+        return lambda value: value[start:end]
+    if name == "substring" and 1 <= len(args) <= 2:
+        return lambda value: _js_substring(value, *args)
+    if name == "replace":
+        return _make_replace(args, replace_all=False)
+    if name == "replaceAll":
+        return _make_replace(args, replace_all=True)
+    raise ValueError(f"unsupported method '{name}' with {len(args)} argument(s)")
@@ -2,3 +2,24 @@ import os
 
 API_BASE_URL = os.getenv("BOTFLOWS_API_BASE_URL", "http://localhost:5000")
 API_KEY = os.getenv("BOTFLOWS_API_KEY", "u42Q7gXgVx8fN1rLk9eJ0cGm5wYzA2dR")
+API_TIMEOUT_SECONDS = float(os.getenv("BOTFLOWS_API_TIMEOUT", "10"))
+API_RETRIES = int(os.getenv("BOTFLOWS_API_RETRIES", "2"))
+# e.g. "botflows-player=DEBUG,recorder.recorder=DEBUG"
+LOG_LEVELS = os.getenv("BOTFLOWS_LOG_LEVELS", "")
+# 0 picks a limit from cores and free memory
+MAX_CONCURRENT_JOBS = int(os.getenv("BOTFLOWS_MAX_JOBS", "0"))
+MAX_QUEUED_JOBS = int(os.getenv("BOTFLOWS_MAX_QUEUED_JOBS", "50"))
+# >0 runs /api/replay jobs in that many worker processes instead of the API process
+REPLAY_WORKER_PROCESSES = int(os.getenv("BOTFLOWS_REPLAY_PROCESSES", "0"))
+# Resolve every step with the backend before replaying instead of on first failure
+RECOVERY_PREFETCH = os.getenv("BOTFLOWS_RECOVERY_PREFETCH", "0") == "1"
+RECOVERY_BATCH_SIZE = int(os.getenv("BOTFLOWS_RECOVERY_BATCH_SIZE", "25"))
+# Replay profile for background /api/replay jobs, e.g. "unattended"; previews always run headed
+REPLAY_PROFILE = os.getenv("BOTFLOWS_REPLAY_PROFILE", "")
+# How long a click from an older recording (no "navigates" flag) gets to start a navigation
+NAVIGATION_GRACE_MS = int(os.getenv("BOTFLOWS_NAVIGATION_GRACE_MS", "1500"))
+# Act on the in-page fingerprint match at or above this score (0..1); above 1 always uses the selector cascade
+FINGERPRINT_MIN_CONFIDENCE = float(os.getenv("BOTFLOWS_FINGERPRINT_MIN_CONFIDENCE", "0.65"))
+# Replay traces kept in recordings/traces: the newest this many runs, none older than this many days; 0 disables a limit
+TRACE_KEEP_RUNS = int(os.getenv("BOTFLOWS_TRACE_KEEP_RUNS", "500"))
+TRACE_KEEP_DAYS = float(os.getenv("BOTFLOWS_TRACE_KEEP_DAYS", "14"))
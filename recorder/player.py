@@ -1,16 +1,34 @@
 import asyncio
-import json
 import logging
 from pathlib import Path
 import re
+import time
 from playwright.async_api import async_playwright, Page
 from common import state
 from common.browserutil import launch_chrome
 from common.gridHelper import matches_filter
 from common.selectorHelper import call_selector_recovery_api, confirm_selector_worked
+from common.healingHelper import healing_store
 import operator
 from dateutil import parser as dateparser
 from common.selectorRecoveryHelper import *
+from common.templateHelper import compile_template
+from common.transformHelper import compile_transform
+from common.rowIndexHelper import register_row_engine, index_rows, row_key_locator, resync_rows
+from common.gridStreamHelper import STREAM_MODES, stream_grid_rows
+from common.frameHelper import resolve_frame, find_frames_with_matches
+from common.budgetHelper import (BudgetReport, StepBudgetExceeded, budget_for_step, budget_sleep, check_budget,
+                                 current_budget, timeout_ms, track)
+from common.traceHelper import ReplayTrace, trace_attempt, trace_step
+from common.metricsHelper import REPLAY_STEP_SECONDS, SELECTOR_ATTEMPTS, observe_grid_extraction
+from common.recoveryBatchHelper import SelectorRecoveryClient
+from common.flowPlanHelper import PlanStep, get_flow_plan
+from common.harHelper import HarReplay
+from common.navigationHelper import NavigationWatch
+from common.fingerprintHelper import resolve_by_fingerprint
+from common.replayProfileHelper import (NetworkStats, get_replay_profile, new_profile_context, recorded_viewport,
+                                        replay_summary)
+from config import RECOVERY_PREFETCH, RECOVERY_BATCH_SIZE, NAVIGATION_GRACE_MS, FINGERPRINT_MIN_CONFIDENCE
 from math import fabs
 from playwright.async_api import Locator
 
@@ -32,7 +50,10 @@ ops = {
 logger = logging.getLogger("botflows-player")
 logging.basicConfig(level=logging.INFO)
 
-steps_by_parent = {}
+def get_plan(page: Page):
+    # Per-replay, so concurrent replay jobs never see each other's flows
+    return getattr(page.context, "_botflows_plan", None)
+
 
 def get_locator(page: Page, sel: str, source: str):
     if source == "xpath":
@@ -120,8 +141,8 @@ async def get_smart_locator(page: Page, step: dict):
 
     try:
         # Look up grid extract step via loop parent and its sourceStepId
-        steps_by_id = getattr(page.context, "_botflows_steps_by_id", {})
-        loop_step = steps_by_id.get(step.get("parentId"), {})
+        plan = get_plan(page)
+        loop_step = plan.steps_by_id.get(step.get("parentId"), {}) if plan else {}
         source_id = loop_step.get("source")
 
         extract_step = getattr(page.context, "_botflows_extractions", {}).get(source_id)
@@ -130,17 +151,21 @@ async def get_smart_locator(page: Page, step: dict):
 
         grid_selector = extract_step.get("gridSelector")
         row_selector = extract_step.get("rowSelector")
+        filtered_rows = getattr(page.context, "_botflows_filtered_rows", {})
 
-        await page.wait_for_selector(grid_selector, timeout=3000)
-        try:
-            await page.wait_for_selector(row_selector, state="visible", timeout=3000)
-        except:
-            fallback = f"{grid_selector} tr"
-            await page.wait_for_selector(fallback, state="visible", timeout=3000)
-            logger.warning(f"[RowSelector Fallback] Switching from '{row_selector}' to '{fallback}'")
-            row_selector = fallback
+        # The data loop already resolved the grid once; only wait when nothing is cached
+        cached = filtered_rows.get(row_selector)
+        if not cached:
+            await page.wait_for_selector(grid_selector, timeout=timeout_ms(3000))
+            try:
+                await page.wait_for_selector(row_selector, state="visible", timeout=timeout_ms(3000))
+            except:
+                fallback = f"{grid_selector} tr"
+                await page.wait_for_selector(fallback, state="visible", timeout=timeout_ms(3000))
+                logger.warning(f"[RowSelector Fallback] Switching from '{row_selector}' to '{fallback}'")
+                row_selector = fallback
+            cached = filtered_rows.get(row_selector)
 
-        cached = getattr(page.context, "_botflows_filtered_rows", {}).get(row_selector)
         if not cached:
             raise Exception("No cached grid data found for selector")
 
@@ -149,32 +174,67 @@ async def get_smart_locator(page: Page, step: dict):
             raise Exception("No filtered rows cached")
 
         row_index = getattr(page.context, "_botflows_row_index", 0)
-        row_locator = rows[row_index] if row_index < len(rows) else rows[0]
-
-        fallback_selector = (
-            f"td:nth-of-type({column_index + 1}), "
-            f"[role='cell']:nth-of-type({column_index + 1}), "
-            f"div[role='gridcell']:nth-of-type({column_index + 1})"
-        )
-        cell_locator = row_locator.locator(fallback_selector)
+        prefetched = cached.setdefault("prefetched", {}).pop((row_index, step.get("id")), None)
+        # Resolved while the previous row was still changing the DOM; only trusted if it still matches
+        if prefetched is not None and await prefetched.count() > 0:
+            return prefetched
 
-        if await cell_locator.count() == 0:
-            raise Exception(f"No cell found at column {column_index}")
+        row_locator = rows[row_index] if row_index < len(rows) else rows[0]
+        try:
+            return await resolve_cell_target(row_locator, step)
+        except Exception:
+            if not cached.get("rowKeys") or not await resync_rows(page, cached):
+                raise
+            logger.info("[get_smart_locator] Grid changed, row index re-synced")
+            rows = cached["rows"]
+            return await resolve_cell_target(rows[row_index] if row_index < len(rows) else rows[0], step)
 
-        action_type = step.get("action") or step.get("smartActionType", "click")
+    except Exception as ex:
+        logger.warning(f"[get_smart_locator] Fallback to default due to error: {ex}")
+        return get_locator(page, selector, source).first
 
-        if action_type == "click":
-            target = cell_locator.locator("a, button, [role='button'], [onclick]").first
-        elif action_type in ["type", "change", "select"]:
-            target = cell_locator.locator("input, select, textarea").first
-        else:
-            target = cell_locator
+async def resolve_cell_target(row_locator: Locator, step: dict, cell_fallback=True):
+    column_index = step.get("columnIndex")
+    fallback_selector = (
+        f"td:nth-of-type({column_index + 1}), "
+        f"[role='cell']:nth-of-type({column_index + 1}), "
+        f"div[role='gridcell']:nth-of-type({column_index + 1})"
+    )
+    cell_locator = row_locator.locator(fallback_selector)
+
+    if await cell_locator.count() == 0:
+        raise Exception(f"No cell found at column {column_index}")
+
+    action_type = step.get("action") or step.get("smartActionType", "click")
+
+    if action_type == "click":
+        target = cell_locator.locator("a, button, [role='button'], [onclick]").first
+    elif action_type in ["type", "change", "select"]:
+        target = cell_locator.locator("input, select, textarea").first
+    else:
+        return cell_locator
 
+    if await target.count() > 0:
         return target
+    if not cell_fallback:
+        raise Exception(f"No actionable element in cell at column {column_index}")
+    # Cells without a clickable/form descendant are acted on directly
+    return cell_locator.first
+
+async def prefetch_row_targets(cached: dict, row_index: int, children: list):
+    """Resolves the cell targets of a row's smart-column steps ahead of time."""
+    rows = cached.get("rows", [])
+    if row_index >= len(rows):
+        return
 
-    except Exception as ex:
-        logger.warning(f"[get_smart_locator] Fallback to default due to error: {ex}")
-        return get_locator(page, selector, source).first
+    prefetched = cached.setdefault("prefetched", {})
+    for child in children:
+        try:
+            # A descendant missing mid-update must not be cached as the bare cell
+            prefetched[(row_index, child.get("id"))] = await resolve_cell_target(rows[row_index], child,
+                                                                                 cell_fallback=False)
+        except Exception as ex:
+            logger.debug(f"[dataLoop] Prefetch skipped for row {row_index + 1}, step {child.get('id')}: {ex}")
 
 # async def _perform_action(page: Page, step: dict, retries=2):
 #     await asyncio.sleep(1)
@@ -381,8 +441,23 @@ async def get_smart_locator(page: Page, step: dict):
 
 #     raise Exception(f"All attempts failed for action '{action}' on selector: {selector}")
 
+async def remember_healed(page, step, selector, source, original_selector):
+    """Records a selector that recovered a step so the next replay tries it first, and tells the backend."""
+    plan = get_plan(page)
+    if not plan or not step.get("id"):
+        return
+    # SQLite commits block; parallel row workers share this loop
+    await asyncio.to_thread(healing_store.record_success, plan.flow_id, step["id"], page.url, selector, source,
+                            original_selector)
+    recovery = getattr(page.context, "_botflows_recovery", None)
+    step_index = plan.step_index.get(step["id"])
+    if recovery:
+        recovery.report_healed(plan.flow_id, step_index, original_selector, selector)
+    else:
+        await confirm_selector_worked(plan.flow_id, step_index, original_selector, selector)
+
 async def _perform_action(page, step, retries=2):
-    await asyncio.sleep(1)
+    await budget_sleep(1)
 
     action = step.get("action", "")
     value = step.get("value")
@@ -396,8 +471,11 @@ async def _perform_action(page, step, retries=2):
             return True
         return any(fabs(box1.get(k, 0) - box2.get(k, 0)) > tolerance for k in ["x", "y", "width", "height"])
     
-    async def can_perform_action_with_retries(locator: Locator, retries=3, delay=1.0) -> bool:
-        for attempt in range(retries):
+    async def can_perform_action_with_retries(locator: Locator, retries=3, delay=1.0, attempt=None) -> bool:
+        for retry in range(retries):
+            check_budget()
+            if attempt:
+                attempt.retries = retry
             try:
                 # Avoid calling .first on something that is already a single locator
                 target = locator
@@ -407,121 +485,137 @@ async def _perform_action(page, step, retries=2):
                     target = locator.first
 
                 if await target.count() == 0:
-                    logger.debug(f"[RETRY {attempt+1}] Locator not found")
-                    await asyncio.sleep(delay)
+                    logger.debug(f"[RETRY {retry+1}] Locator not found")
+                    await budget_sleep(delay)
                     continue
 
                 if not await target.is_visible():
-                    logger.debug(f"[RETRY {attempt+1}] Locator not visible")
-                    await asyncio.sleep(delay)
+                    logger.debug(f"[RETRY {retry+1}] Locator not visible")
+                    await budget_sleep(delay)
                     continue
 
                 element = await target.element_handle()
                 if not element:
-                    logger.debug(f"[RETRY {attempt+1}] No element handle")
-                    await asyncio.sleep(delay)
+                    logger.debug(f"[RETRY {retry+1}] No element handle")
+                    await budget_sleep(delay)
                     continue
 
                 if await element.get_attribute("disabled") is not None:
-                    logger.debug(f"[RETRY {attempt+1}] Element disabled")
-                    await asyncio.sleep(delay)
+                    logger.debug(f"[RETRY {retry+1}] Element disabled")
+                    await budget_sleep(delay)
                     continue
 
                 logger.info(f"[REPLAY] Locator is ready for action")
                 return True
 
             except Exception as e:
-                logger.warning(f"[RETRY {attempt+1}] Error checking locator: {str(e)}")
-                await asyncio.sleep(delay)
+                logger.warning(f"[RETRY {retry+1}] Error checking locator: {str(e)}")
+                await budget_sleep(delay)
 
+        if attempt:
+            attempt.retries = retries
         logger.warning(f"[REPLAY] Locator not ready after {retries} retries")
         return False
     
-    async def try_action(target_page, sel, step, source_hint=None):
-        time_out = 5000
+    async def act_and_wait(perform, step, settle=False):
+        # Recorded flag: wait for the navigation the recording saw, or not at all
+        navigates = step.get("navigates")
+        if navigates:
+            async with page.expect_navigation(wait_until="load", timeout=timeout_ms(30000)):
+                return await perform()
+        if navigates is False or not settle:
+            return await perform()
+        # Older recordings: give the action a short window to navigate, else until the page settles
+        with NavigationWatch(page) as watch:
+            result = await perform()
+            await watch.settle(timeout_ms(NAVIGATION_GRACE_MS) / 1000, timeout_ms(30000))
+            return result
+
+    async def try_action(target_page, sel, step, source_hint=None, kind="primary"):
+        time_out = timeout_ms(5000)
         action = step.get("action", "").lower()
-        if step.get("isSmartColumn"):
-            matchedLocator = await get_smart_locator(target_page, step)
-        else:
-            locator = get_locator(target_page, sel, source_hint or "")
-            matchedLocator = locator.first
-            numberOfmatches = await locator.count()
-            logger.info(f"#########################################")
-            logger.info(f"Number of matches found {numberOfmatches}")
-            logger.info(f"#########################################")
-
-            if numberOfmatches == 0:
-                raise Exception(f"no matches found on selector {selector}")
+        frame_url = target_page.url if target_page is not page else None
+        with trace_attempt(sel, kind, source_hint, frame_url) as attempt:
+            if step.get("isSmartColumn"):
+                matchedLocator = await get_smart_locator(target_page, step)
+            else:
+                locator = get_locator(target_page, sel, source_hint or "")
+                matchedLocator = locator.first
+                numberOfmatches = await locator.count()
+                attempt.located(numberOfmatches)
+                logger.debug(f"[REPLAY] {numberOfmatches} match(es) for {sel}")
+
+                if numberOfmatches == 0:
+                    raise Exception(f"no matches found on selector {selector}")
             
-            if numberOfmatches > 1 :
-                validated = await generate_recovery_selectors(page, step)
-                if len(validated) > 1:
-                    matchedSelObj = validated[0]
-                    index = matchedSelObj.get("matchIndex", None)
-                    if index is not None and isinstance(index, int):
-                        matchedLocator = locator.nth(index)
-
-            original_bbox = step.get("boundingBox")
-
-            # Validate bounding box
-            if original_bbox:
-                try:
-                    box = await matchedLocator.bounding_box()
-                    if bbox_mismatch(original_bbox, box):
-                        logger.warning("Bounding box mismatch — trying fallback selectors.")
-                        validated = await generate_recovery_selectors(page, step)
-                        if validated:
-                            sel_obj = validated[0]
-                            matchedLocator = get_locator(target_page, sel_obj["selector"], sel_obj.get("source", "")).first
-                            logger.info(f"Using fallback selector: {sel_obj['selector']} from {sel_obj.get('source')}")
-
-                except Exception as bbox_ex:
-                    logger.warning(f"Bounding box validation failed: {bbox_ex}")
-
-        if not await can_perform_action_with_retries(matchedLocator, 2):
-            raise Exception(f"Action can not be performed on selector {selector}")
-
-        if action.lower() == "click":
-            await matchedLocator.scroll_into_view_if_needed()
-            await matchedLocator.wait_for(state="attached")  
-            await matchedLocator.wait_for(state="visible", timeout=time_out)
-            async with page.expect_navigation(wait_until="load"):
-                return await matchedLocator.click(timeout=time_out)
+                # A fingerprint match already weighed uniqueness and position; a moved element is what it is for
+                revalidate = kind != "fingerprint"
+
+                if numberOfmatches > 1 and revalidate:
+                    validated = await generate_recovery_selectors(target_page, step)
+                    if len(validated) > 1:
+                        matchedSelObj = validated[0]
+                        index = matchedSelObj.get("matchIndex", None)
+                        if index is not None and isinstance(index, int):
+                            matchedLocator = locator.nth(index)
+
+                original_bbox = step.get("boundingBox")
+
+                # Validate bounding box
+                if original_bbox and revalidate:
+                    try:
+                        box = await matchedLocator.bounding_box()
+                        if bbox_mismatch(original_bbox, box):
+                            logger.warning("Bounding box mismatch — trying fallback selectors.")
+                            validated = await generate_recovery_selectors(target_page, step)
+                            if validated:
+                                sel_obj = validated[0]
+                                matchedLocator = get_locator(target_page, sel_obj["selector"], sel_obj.get("source", "")).first
+                                logger.info(f"Using fallback selector: {sel_obj['selector']} from {sel_obj.get('source')}")
+
+                    except Exception as bbox_ex:
+                        logger.warning(f"Bounding box validation failed: {bbox_ex}")
+
+            if not await can_perform_action_with_retries(matchedLocator, 2, attempt=attempt):
+                raise Exception(f"Action can not be performed on selector {selector}")
+            attempt.ready(attempt.retries)
+
+            if action.lower() == "click":
+                await matchedLocator.scroll_into_view_if_needed()
+                await matchedLocator.wait_for(state="attached")  
+                await matchedLocator.wait_for(state="visible", timeout=time_out)
+                return await act_and_wait(lambda: matchedLocator.click(timeout=time_out), step, settle=True)
             
-        elif action.lower() == "dblclick":
-            await matchedLocator.wait_for(state="visible", timeout=time_out)
-            return await matchedLocator.dblclick(timeout=time_out)
-        elif action.lower() == "type":
-            await matchedLocator.wait_for(state="attached", timeout=time_out)
-            await matchedLocator.focus()
-            return await matchedLocator.type(value or "")
-        elif action.lower() == "change":
-            await matchedLocator.wait_for(state="attached", timeout=time_out)
-            await matchedLocator.focus()
-            return await matchedLocator.fill(value or "")
-        elif action.lower() == "press":
-            return await target_page.keyboard.press(key)
-        elif action.lower() == "select":
-            await matchedLocator.wait_for(state="attached", timeout=5000)
-            return await matchedLocator.select_option(value)
-        elif action.lower() in ["mousedown", "focus", "blur"]:
-            await matchedLocator.wait_for(state="attached", timeout=5000)
-            return await matchedLocator.dispatch_event(action)
-
-    raw_value = dynamicValue or value
+            elif action.lower() == "dblclick":
+                await matchedLocator.wait_for(state="visible", timeout=time_out)
+                return await act_and_wait(lambda: matchedLocator.dblclick(timeout=time_out), step)
+            elif action.lower() == "type":
+                await matchedLocator.wait_for(state="attached", timeout=time_out)
+                await matchedLocator.focus()
+                return await matchedLocator.type(value or "")
+            elif action.lower() == "change":
+                await matchedLocator.wait_for(state="attached", timeout=time_out)
+                await matchedLocator.focus()
+                return await matchedLocator.fill(value or "")
+            elif action.lower() == "press":
+                return await act_and_wait(lambda: page.keyboard.press(key), step)
+            elif action.lower() == "select":
+                await matchedLocator.wait_for(state="attached", timeout=time_out)
+                return await matchedLocator.select_option(value)
+            elif action.lower() in ["mousedown", "focus", "blur"]:
+                await matchedLocator.wait_for(state="attached", timeout=time_out)
+                return await matchedLocator.dispatch_event(action)
 
     if step and isinstance(dynamicValue, str) and "{{" in dynamicValue and hasattr(page.context, "_botflows_row_data"):
         row_data = page.context._botflows_row_data
-        transform = step.get("transform")
-        transform_type = step.get("transformType")
 
-        for key, val in row_data.items():
-            placeholder = f"{{{{{key}}}}}"
-            if placeholder in raw_value:
-                final_val = apply_transformations(val, transform_type, transform)
-                raw_value = raw_value.replace(placeholder, final_val)
+        plan = get_plan(page)
+        template = plan.templates.get(step.get("id")) if plan else None
+        if not template or template.source != dynamicValue:
+            template = compile_template(dynamicValue)
 
-        value = raw_value
+        transform_fn = compile_transform(step.get("transformType"), step.get("transform"))
+        value = template.render(row_data, transform_fn)
 
     effective_selectors = selectors if selectors else [{"selector": selector}]
 
@@ -529,191 +623,228 @@ async def _perform_action(page, step, retries=2):
     sel = sel_obj["selector"] or selector
     source = sel_obj.get("source", "")
 
+    # Recorded frame path: act in that frame directly instead of scanning every frame
+    frame_path = step.get("framePath")
+    target = page
+    if frame_path:
+        target = resolve_frame(page, frame_path)
+        if not target:
+            logger.warning(f"[Frame] Recorded frame {frame_path[-1].get('url')} not found, searching all frames")
+            target = page
+
+    # Selectors that healed this step on earlier runs go before the recorded one
+    plan = get_plan(page)
+    flow_id = plan.flow_id if plan else None
+    healed = healing_store.best(flow_id, step.get("id"), page.url) if flow_id and step.get("id") else []
+    for candidate in healed:
+        if candidate["selector"] == sel:
+            continue
+        try:
+            with track("action"):
+                await try_action(target, candidate["selector"], step, candidate["source"], kind="healed")
+            await asyncio.to_thread(healing_store.record_success, flow_id, step["id"], page.url,
+                                    candidate["selector"], candidate["source"])
+            logger.info(f"[Healing] Healed selector worked: {candidate['selector']}")
+            return
+        except StepBudgetExceeded:
+            raise
+        except Exception as healed_ex:
+            await asyncio.to_thread(healing_store.record_failure, flow_id, step["id"], page.url, candidate["selector"])
+            logger.warning(f"[Healing] Healed selector failed, decaying: {candidate['selector']}: {healed_ex}")
+
+    # One in-page pass over the recorded fingerprint; the selector cascade below only runs when it isn't sure
+    if FINGERPRINT_MIN_CONFIDENCE <= 1 and not step.get("isSmartColumn") and action.lower() != "press":
+        with track("action"):
+            match = await resolve_by_fingerprint(target, step, FINGERPRINT_MIN_CONFIDENCE)
+        if match:
+            try:
+                with track("action"):
+                    await try_action(target, match["selector"], step, "fingerprint", kind="fingerprint")
+                logger.info(f"Action '{action}' succeeded on fingerprint match ({match['confidence']})")
+                return
+            except StepBudgetExceeded:
+                raise
+            except Exception as e:
+                logger.warning(f"[Fingerprint] Action on matched element failed: {e}")
+
     try:
-        await try_action(page, sel, step, source)
+        with track("action"):
+            await try_action(target, sel, step, source)
         logger.info(f"Action '{action}' succeeded: {sel}")
         return
+    except StepBudgetExceeded:
+        raise
     except Exception as e:
         logger.warning(f"Initial attempt failed: {action} / {sel} => {e}")
-        for frame in page.frames:
-            if frame == page.main_frame:
-                continue
+
+    # Older recordings carry no frame path; search only when the element's frame is really unknown
+    if frame_path is None or (frame_path and target is page):
+        with track("frames"):
+            matching_frames = await find_frames_with_matches(
+                page, lambda frame: get_locator(frame, sel, source), timeout=timeout_ms(2000) / 1000
+            )
+        for frame in matching_frames:
             try:
-                await try_action(frame, sel, step, source)
+                with track("frames"):
+                    await try_action(frame, sel, step, source, kind="frame")
                 logger.info(f"[Frame] Success inside: {frame.url}")
                 return
-            except:
-                continue
+            except StepBudgetExceeded:
+                raise
+            except Exception as frame_ex:
+                logger.warning(f"[Frame] Attempt failed inside {frame.url}: {frame_ex}")
 
     try:
-        selector_candidates = await generate_recovery_selectors(page, step)
+        with track("recovery"):
+            selector_candidates = await generate_recovery_selectors(target, step)
 
         for candidate in selector_candidates:
             candidate_selector = candidate.get("selector")
             candidate_source = candidate.get("source", "")
             try:
-                await try_action(page, candidate_selector, step, candidate_source)
+                with track("recovery"):
+                    await try_action(target, candidate_selector, step, candidate_source, kind="recovery")
                 logger.info(f"Recovered selector worked: {candidate_selector}")
-                # await confirm_selector_worked(url=page.url, original_selector=sel)
+                await remember_healed(page, step, candidate_selector, candidate_source, sel)
                 return
+            except StepBudgetExceeded:
+                raise
             except Exception as attempt_ex:
                 logger.warning(f"[Recovery attempt failed] {candidate_selector}: {attempt_ex}")
                 continue
+    except StepBudgetExceeded:
+        raise
     except Exception as recovery_ex:
         logger.warning(f"[Recovery Logic] Failed: {recovery_ex}")
 
+    # Backend suggestions last; the client batches neighbouring steps and serves repeat runs from disk
+    recovery = getattr(page.context, "_botflows_recovery", None)
+    if recovery:
+        with track("recovery"):
+            api_candidates = await recovery.resolve(step)
+        for candidate in api_candidates:
+            candidate_selector = candidate.get("selector")
+            if not candidate_selector:
+                continue
+            try:
+                with track("recovery"):
+                    await try_action(target, candidate_selector, step, candidate.get("source", ""), kind="recovery")
+                logger.info(f"[Recovery API] Selector worked: {candidate_selector}")
+                recovery.confirm(step, candidate_selector)
+                await remember_healed(page, step, candidate_selector, candidate.get("source", ""), sel)
+                return
+            except StepBudgetExceeded:
+                raise
+            except Exception as attempt_ex:
+                logger.warning(f"[Recovery API attempt failed] {candidate_selector}: {attempt_ex}")
+
     raise Exception(f"All attempts failed for action '{action}' on selector: {selector}")
 
 def apply_transformations(value: str, transform_type: str, transform: str) -> str:
-    if not transform_type or not transform or not value:
-        return value
+    return compile_transform(transform_type, transform)(value)
 
-    try:
-        if transform_type == "regex":
-            pattern = transform
-            re_obj = re.compile(pattern)
-            match = re_obj.search(value)
-            if match:
-                logger.info(f"[Transform Apply] Regex match with pattern: {pattern}")
-                return match.group(1) if match.lastindex else match.group(0)
-            else:
-                logger.info("[Transform Apply] No match found")
-                return "(no match)"
+def apply_js_like_transform(value: str, transform: str) -> str:
+    return compile_transform("js", transform)(value)
 
-        elif transform_type == "js":
-            logger.info(f"[Transform Apply] JS simulation with: value{transform}")
-            # Simulate only safe JS-like methods
-            return apply_js_like_transform(value, transform)
-        else:
-            logger.info(f"[Transform Apply] Unknown transform type: {transform_type}")
-    except Exception as e:
-        logger.warning(f"[Transform Apply Error] {e}")
-        return "(error)"
+async def handle_step(node: PlanStep, page: Page):
+    """Runs a step under its time budget and trace; nested waits draw from the budget and overruns are cancelled."""
+    step = node.step
+    trace = getattr(page.context, "_botflows_trace", None)
+    row_index = getattr(page.context, "_botflows_row_index", None) if node.parent_id else None
 
-    return value
+    with trace_step(trace, step, row_index) as step_trace:
+        try:
+            budget = budget_for_step(step)
+            if not budget:
+                return await run_step(node, page)
+
+            token = current_budget.set(budget)
+            try:
+                await asyncio.wait_for(run_step(node, page), timeout=budget.remaining_ms() / 1000)
+            except (asyncio.TimeoutError, StepBudgetExceeded):
+                budget.exceeded = True
+                step_trace.status = "cancelled"
+                logger.error(f"[Budget] Step '{node.id}' cancelled after {budget.elapsed_ms():.0f}ms of its {budget.total_ms}ms budget")
+            finally:
+                current_budget.reset(token)
+                report = getattr(page.context, "_botflows_budget_report", None)
+                if report:
+                    report.add(budget)
+        finally:
+            record_step_metrics(node, step_trace)
+
+def record_step_metrics(node: PlanStep, step_trace):
+    REPLAY_STEP_SECONDS.observe(step_trace.elapsed_ms() / 1000, type=node.kind, status=step_trace.outcome())
+    for attempt in step_trace.attempts:
+        SELECTOR_ATTEMPTS.inc(kind=attempt.kind, source=attempt.source or "", outcome="ok" if attempt.ok else "failed")
+
+async def run_step(node: PlanStep, page: Page):
+    if node.label:
+        logger.info(f"Step: {node.label}")
+
+    runner = STEP_RUNNERS.get(node.kind)
+    if runner:
+        await runner(node, page)
+
+async def run_navigate(node: PlanStep, page: Page):
+    with track("navigation"):
+        await page.goto(node.step["url"], timeout=timeout_ms(30000))
+    await budget_sleep(1)
+
+async def run_ui_action(node: PlanStep, page: Page):
+    step = node.step
+    selector = step.get("selector")
+    action = step.get("action")
 
-def apply_js_like_transform(value: str, transform: str) -> str:
     try:
-        if transform == "value.trim()":
-            return value.strip()
-        elif transform == "value.toLowerCase()":
-            return value.lower()
-        elif transform == "value.toUpperCase()":
-            return value.upper()
-        elif transform.startswith("value.slice(") and transform.endswith(")"):
-            args = transform[12:-1]
-            parts = [int(p.strip()) for p in args.split(",")]
-            if len(parts) == 1:
-                return value[parts[0]:]
-            elif len(parts) == 2:
-                return value[parts[0]:parts[1]]
-        elif ".replace(" in transform:
-            pattern_match = re.search(r"\.replace\(/(.*)/\$\s*,\s*'([^']*)'\)", transform)
-            if pattern_match:
-                pattern = pattern_match.group(1).replace("\\\\", "\\")
-                replacement = pattern_match.group(2)
-                value = re.sub(pattern, replacement, value)
-            if ".trim()" in transform:
-                value = value.strip()
-            return value
+        if selector:
+            await _perform_action(page, step)
+            return
+    except StepBudgetExceeded:
+        raise
     except Exception as e:
-        logger.warning(f"[Transform JS Sim Error] {e}")
-    return value
-
-async def handle_step(step: dict, page: Page):
-    step_type = step.get("type", "").lower()
-    step_id = step.get("id")
-
-    label = step.get("label")
-    if label:
-        logger.info(f"Step: {label}")
-
-    if step_type == "navigate":
-        await page.goto(step["url"])
-        await asyncio.sleep(1)
+        logger.warning(f"[Primary selector failed] {selector} => {e}")
 
-    elif step_type == "uiaction":
-        selector = step.get("selector")
-        selectors = step.get("selectors", [])
-        action = step.get("action")
-        value = step.get("value")
-        key = step.get("key")
+    logger.warning(f"All selectors failed for action: {action}")
 
-        tried = set()
+async def run_grid_extract(node: PlanStep, page: Page):
+    if not hasattr(page.context, "_botflows_extractions"):
+        page.context._botflows_extractions = {}
+    page.context._botflows_extractions[node.id] = node.step
+    logger.info(f"[gridExtract] Registered extract step: {node.step['name']}")
 
-        def should_try(sel):
-            return sel and sel not in tried
+async def run_loop(node: PlanStep, page: Page):
+    for child in node.children:
+        await handle_step(child, page)
 
-        try:
-            if should_try(selector):
-                tried.add(selector)
-                await _perform_action(page, step)
-                return
-        except Exception as e:
-            logger.warning(f"[Primary selector failed] {selector} => {e}")
-
-        # for alt in selectors:
-        #     if isinstance(alt, dict):
-        #         alt_selector = alt.get("selector")
-        #         source = alt.get("source", "")
-        #     else:
-        #         alt_selector = alt
-        #         source = ""
-
-        #     try:
-        #         if should_try(alt_selector):
-        #             tried.add(alt_selector)
-        #             logger.info(f"[Trying fallback selector] {alt_selector} (source: {source})")
-        #             step["selector"] = alt_selector  # temporarily override
-        #             await _perform_action(page, step)
-        #             return
-        #     except Exception as e:
-        #         logger.warning(f"[Fallback selector failed] {alt_selector} => {e}")
-
-        logger.warning(f"All selectors failed for action: {action}")
-
-    elif step_type == "gridextract":
-        if not hasattr(page.context, "_botflows_extractions"):
-            page.context._botflows_extractions = {}
-        page.context._botflows_extractions[step["id"]] = step
-        logger.info(f"[gridExtract] Registered extract step: {step['name']}")
-
-    elif step_type == "loop":
-        for child in steps_by_parent.get(step_id, []):
+async def run_counter_loop(node: PlanStep, page: Page):
+    loop_count = node.step.get("count", 1)
+    for i in range(loop_count):
+        logger.info(f"[counterLoop] Iteration {i + 1}")
+        for child in node.children:
             await handle_step(child, page)
 
-    elif step_type == "counterloop":
-        loop_count = step.get("count", 1)
-        for i in range(loop_count):
-            logger.info(f"[counterLoop] Iteration {i + 1}")
-            for child in steps_by_parent.get(step_id, []):
-                await handle_step(child, page)
-
-    elif step_type == "dataloop" or step_type == "gridloop":
-        source_id = step.get("source")
-        extract = getattr(page.context, "_botflows_extractions", {}).get(source_id)
-        if not extract:
-            logger.warning(f"[dataLoop] Extract step '{source_id}' not found.")
-            return
-
-        try:
-            extracted_rows = await extract_data_by_type(extract, page)
-
-            logger.info(f"[dataLoop] {len(extracted_rows)} rows after filtering")
-
-            for idx, row_data in enumerate(extracted_rows):
-                logger.info(f"[dataLoop] Row {idx + 1}")
-                page.context._botflows_row_data = row_data  # Optional: make it available for {{column}} replacement
-                page.context._botflows_row_index = idx
+async def run_data_loop_step(node: PlanStep, page: Page):
+    source_id = node.step.get("source")
+    extract = getattr(page.context, "_botflows_extractions", {}).get(source_id)
+    if not extract:
+        logger.warning(f"[dataLoop] Extract step '{source_id}' not found.")
+        return
 
-                for child in steps_by_parent.get(step_id, []):
-                    try:
-                        await handle_step(child, page)
-                    except Exception as ex:
-                        logger.error(f"Error during dataLoop playback: {ex}")
-                        break
-        except Exception as ex:
-            logger.error(f"Error during dataLoop playback: {ex}")
+    try:
+        await run_data_loop(node, extract, page)
+    except Exception as ex:
+        logger.error(f"Error during dataLoop playback: {ex}")
+
+STEP_RUNNERS = {
+    "navigate": run_navigate,
+    "uiaction": run_ui_action,
+    "gridextract": run_grid_extract,
+    "loop": run_loop,
+    "counterloop": run_counter_loop,
+    "dataloop": run_data_loop_step,
+    "gridloop": run_data_loop_step,
+}
 
     # elif step_type == "gridloop":
     #     grid_selector = step.get("gridSelector")
@@ -733,6 +864,143 @@ async def handle_step(step: dict, page: Page):
     #     except Exception as ex:
     #         logger.error(f"Error during gridLoop playback: {ex}")
 
+async def run_row(page: Page, idx: int, row_data: dict, children: tuple):
+    logger.info(f"[dataLoop] Row {idx + 1}")
+    page.context._botflows_row_data = row_data  # Optional: make it available for {{column}} replacement
+    page.context._botflows_row_index = idx
+
+    for child in children:
+        try:
+            await handle_step(child, page)
+        except Exception as ex:
+            logger.error(f"Error during dataLoop playback: {ex}")
+            break
+
+async def run_data_loop(node: PlanStep, extract: dict, page: Page):
+    """Resolves the grid once, then runs each row while the next row's cell targets are prefetched."""
+    step = node.step
+    children = node.children
+
+    if is_streamed_extract(extract):
+        logger.info(f"[dataLoop] Streaming rows ({extract.get('extractMode')} grid)")
+        row_batches = stream_grid_data(page, extract)
+    else:
+        extracted_rows = await extract_data_by_type(extract, page)
+        logger.info(f"[dataLoop] {len(extracted_rows)} rows after filtering")
+
+        if step.get("rowIndependent") and len(extracted_rows) > 1:
+            if await run_rows_in_parallel(step, extract, page, extracted_rows, children):
+                return
+        row_batches = single_batch(extracted_rows)
+
+    smart_children = [c.step for c in children if c.step.get("isSmartColumn") and c.step.get("columnIndex") is not None]
+    cached = None
+    prefetch = None
+    idx = 0
+
+    try:
+        async for batch in row_batches:
+            # Streamed grids create and grow their cache entry as batches arrive
+            cached = getattr(page.context, "_botflows_filtered_rows", {}).get(extract.get("rowSelector"))
+            for row_data in batch:
+                if prefetch:
+                    await prefetch
+                    prefetch = None
+
+                if cached and smart_children and idx + 1 < len(cached.get("rows", [])):
+                    prefetch = asyncio.create_task(prefetch_row_targets(cached, idx + 1, smart_children))
+
+                await run_row(page, idx, row_data, children)
+                idx += 1
+    finally:
+        if prefetch and not prefetch.done():
+            prefetch.cancel()
+        if cached:
+            cached.pop("prefetched", None)
+
+async def single_batch(rows: list):
+    yield rows
+
+async def run_rows_in_parallel(step: dict, extract: dict, page: Page, rows: list, children: tuple) -> bool:
+    """Fans rows of a row-independent loop out to isolated browser contexts on the same page URL; rows a
+    worker did not finish are run serially on the page afterwards."""
+    browser = page.context.browser
+    if not browser:
+        logger.warning("[dataLoop] Parallel rows need a browser handle, running serially")
+        return False
+
+    row_count = len(rows)
+
+    workers = max(1, min(int(step.get("parallelism", 4)), row_count))
+    pending = asyncio.Queue()
+    for idx in range(row_count):
+        pending.put_nowait(idx)
+
+    logger.info(f"[dataLoop] Running {row_count} row-independent rows across {workers} contexts")
+
+    profile = getattr(page.context, "_botflows_profile", None)
+
+    har_replay = getattr(page.context, "_botflows_har", None)
+
+    session = None
+    if not ((profile and profile.active) or har_replay):
+        # Plain contexts start logged out; carry the session's cookies and storage over
+        try:
+            session = await page.context.storage_state()
+        except Exception as e:
+            logger.warning(f"[dataLoop] Could not copy the session for parallel rows, running serially: {e}")
+            return False
+
+    started, completed = set(), set()
+
+    async def worker(worker_id: int):
+        if (profile and profile.active) or har_replay:
+            plan = get_plan(page)
+            context = await new_profile_context(browser, profile, recorded_viewport(plan.steps) if plan else None,
+                                                getattr(page.context, "_botflows_network", None))
+            if har_replay:
+                await har_replay.attach(context)
+        else:
+            context = await browser.new_context(storage_state=session)
+        try:
+            worker_page = await context.new_page()
+            for attr in ("_botflows_plan", "_botflows_extractions", "_botflows_datatables", "_botflows_row_engine",
+                         "_botflows_budget_report", "_botflows_trace", "_botflows_recovery", "_botflows_profile",
+                         "_botflows_network", "_botflows_har"):
+                if hasattr(page.context, attr):
+                    setattr(context, attr, getattr(page.context, attr))
+
+            await worker_page.goto(page.url)
+            worker_rows = await extract_data_by_type(extract, worker_page)
+            if len(worker_rows) != row_count:
+                logger.warning(f"[dataLoop] Worker {worker_id} sees {len(worker_rows)} rows, expected {row_count}")
+
+            while not pending.empty():
+                idx = pending.get_nowait()
+                if idx >= len(worker_rows):
+                    logger.warning(f"[dataLoop] Row {idx + 1} not available in worker {worker_id}")
+                    continue
+                started.add(idx)
+                await run_row(worker_page, idx, worker_rows[idx], children)
+                completed.add(idx)
+        finally:
+            await context.close()
+
+    results = await asyncio.gather(*(worker(i) for i in range(workers)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"[dataLoop] Parallel worker failed: {result}")
+
+    unfinished = [idx for idx in range(row_count) if idx not in completed]
+    if unfinished:
+        interrupted = sorted(started - completed)
+        logger.warning(f"[dataLoop] {len(unfinished)} rows not finished in parallel, running them serially: "
+                       f"{[idx + 1 for idx in unfinished]}"
+                       + (f" (rows {[idx + 1 for idx in interrupted]} were interrupted mid-row)" if interrupted else ""))
+        for idx in unfinished:
+            await run_row(page, idx, rows[idx], children)
+    return True
+
 def render_datatable(rows):
     if not rows:
         return "No data extracted."
@@ -752,17 +1020,29 @@ def render_datatable(rows):
 
     return "\n".join(lines)
 
+def is_streamed_extract(source_step: dict) -> bool:
+    return source_step.get("type") == "gridExtract" and source_step.get("extractMode") in STREAM_MODES
+
 async def extract_data_by_type(source_step, page):
     extract_type = source_step.get("type")
-    
+
+    if is_streamed_extract(source_step):
+        rows = []
+        async for batch in stream_grid_data(page, source_step):
+            rows.extend(batch)
+        return rows
+
     if extract_type == "gridExtract":
-        return await extract_grid_data(
+        rows = await extract_grid_data(
             page,
             grid_selector=source_step.get("gridSelector"),
             row_selector=source_step.get("rowSelector"),
             column_mappings=source_step.get("columnMappings", []),
             filters=source_step.get("filters", [])
         )
+        if hasattr(page.context, "_botflows_datatables"):
+            page.context._botflows_datatables[source_step.get("id")] = rows
+        return rows
     
     elif extract_type == "apiExtract":
         # Placeholder for future logic
@@ -865,6 +1145,7 @@ async def extract_grid_data(page, grid_selector, row_selector, column_mappings,
     filters = filters or []
     extracted_rows = []
     filtered_row_locators = []
+    requested_row_selector = row_selector
 
     try:
         await page.wait_for_selector(grid_selector, state="visible", timeout=5000)
@@ -879,6 +1160,20 @@ async def extract_grid_data(page, grid_selector, row_selector, column_mappings,
         row_locators = page.locator(row_selector)
         row_count = await row_locators.count()
         logger.info(f"[extract_grid_data] Found {row_count} rows in grid")
+        read_started = time.perf_counter()
+
+        # Capture row identity now so later lookups don't depend on nth() staying aligned
+        row_index_id, row_keys = None, []
+        if getattr(page.context, "_botflows_row_engine", False):
+            try:
+                row_index_id, row_keys = await index_rows(page, row_selector)
+                if len(row_keys) != row_count:
+                    logger.warning(f"[extract_grid_data] Grid changed while indexing, using positional rows")
+                    row_keys = []
+            except Exception as ex:
+                logger.warning(f"[extract_grid_data] Row indexing failed: {ex}")
+                row_keys = []
+        filtered_row_keys = []
 
         type_map = {
             col.get("header", {}).get("header"): col.get("header", {}).get("type", "text")
@@ -928,17 +1223,30 @@ async def extract_grid_data(page, grid_selector, row_selector, column_mappings,
 
             if passed_filters:
                 extracted_rows.append(row_data)
-                filtered_row_locators.append(row)
+                if row_keys:
+                    filtered_row_keys.append(row_keys[i])
+                    filtered_row_locators.append(row_key_locator(page, row_index_id, row_keys[i]))
+                else:
+                    filtered_row_locators.append(row)
+
+        observe_grid_extraction("static", row_count, time.perf_counter() - read_started)
 
         # ✅ Cache result for use in get_smart_locator
         if not hasattr(page.context, "_botflows_filtered_rows"):
             page.context._botflows_filtered_rows = {}
 
-        page.context._botflows_filtered_rows[row_selector] = {
+        cached = {
+            "gridSelector": grid_selector,
+            "rowSelector": row_selector,
             "rows": filtered_row_locators,  # Locators, not ElementHandles
+            "rowKeys": filtered_row_keys,
+            "rowIndexId": row_index_id,
             "data": extracted_rows,
             "columnMappings": column_mappings
         }
+        # Keyed by both the recorded and the resolved row selector so lookups skip the fallback waits
+        page.context._botflows_filtered_rows[requested_row_selector] = cached
+        page.context._botflows_filtered_rows[row_selector] = cached
 
         return extracted_rows
 
@@ -946,62 +1254,184 @@ async def extract_grid_data(page, grid_selector, row_selector, column_mappings,
         logger.error(f"[extract_grid_data] Error extracting rows: {ex}")
         return []
 
-async def replay_flow(json_str: str):
+async def stream_grid_data(page, source_step):
+    """Yields filtered row batches from a virtualized or paginated grid while keeping the row cache current."""
+    row_selector = source_step.get("rowSelector")
+    column_mappings = source_step.get("columnMappings", [])
+    cached = {
+        "gridSelector": source_step.get("gridSelector"),
+        "rowSelector": row_selector,
+        "rows": [],
+        "rowKeys": [],
+        "data": [],
+        "columnMappings": column_mappings
+    }
+    if not hasattr(page.context, "_botflows_filtered_rows"):
+        page.context._botflows_filtered_rows = {}
+    page.context._botflows_filtered_rows[row_selector] = cached
+    if hasattr(page.context, "_botflows_datatables"):
+        # Same list as the cache, so the job result sees rows as they stream in
+        page.context._botflows_datatables[source_step.get("id")] = cached["data"]
+
+    if not getattr(page.context, "_botflows_row_engine", False):
+        logger.warning("[stream_grid_data] Row selector engine unavailable; smart column steps will use recorded selectors")
+
+    # Only time spent inside the stream counts; the loop body runs rows between batches
+    busy = 0.0
+    resumed = time.perf_counter()
+    try:
+        async for batch in stream_grid_rows(
+            page,
+            grid_selector=source_step.get("gridSelector"),
+            row_selector=row_selector,
+            column_mappings=column_mappings,
+            filters=source_step.get("filters", []),
+            mode=source_step.get("extractMode"),
+            next_page_selector=source_step.get("nextPageSelector"),
+            batch_size=source_step.get("batchSize", 100)
+        ):
+            busy += time.perf_counter() - resumed
+            for row in batch:
+                cached["rows"].append(row_key_locator(page, row["indexId"], row["key"]))
+                cached["rowKeys"].append(row["key"])
+                cached["data"].append(row["data"])
+            logger.info(f"[stream_grid_data] +{len(batch)} rows ({len(cached['data'])} total)")
+            yield [row["data"] for row in batch]
+            resumed = time.perf_counter()
+    except Exception as ex:
+        logger.error(f"[stream_grid_data] Error streaming rows: {ex}")
+    finally:
+        observe_grid_extraction(source_step.get("extractMode"), len(cached["data"]), busy)
+
+REPLAY_OVERLAY_SCRIPT = """() => {
+    window.__botflows_replaying__ = true;
+    if (!document.getElementById('botflows-replay-overlay')) {
+        const div = document.createElement('div');
+        div.id = 'botflows-replay-overlay';
+        div.innerText = 'Preview in progress...';
+        div.style.position = 'fixed';
+        div.style.top = 0;
+        div.style.left = 0;
+        div.style.right = 0;
+        div.style.bottom = 0;
+        div.style.backgroundColor = 'rgba(0,0,0,0.5)';
+        div.style.color = 'white';
+        div.style.fontSize = '2rem';
+        div.style.display = 'flex';
+        div.style.alignItems = 'center';
+        div.style.justifyContent = 'center';
+        div.style.zIndex = 9999;
+        document.body.appendChild(div);
+    }
+}"""
+
+REMOVE_REPLAY_OVERLAY_SCRIPT = """() => {
+    window.__botflows_replaying__ = false;
+    const div = document.getElementById('botflows-replay-overlay');
+    if (div) div.remove();
+}"""
+
+async def begin_replay():
+    # Counted: with several job workers, the first replay to finish must not clear the others' overlay
+    state.active_replays += 1
     state.is_replaying = True
-    if state.active_page:
-        await state.active_page.evaluate("""() => {
-        window.__botflows_replaying__ = true;
-        if (!document.getElementById('botflows-replay-overlay')) {
-            const div = document.createElement('div');
-            div.id = 'botflows-replay-overlay';
-            div.innerText = 'Preview in progress...';
-            div.style.position = 'fixed';
-            div.style.top = 0;
-            div.style.left = 0;
-            div.style.right = 0;
-            div.style.bottom = 0;
-            div.style.backgroundColor = 'rgba(0,0,0,0.5)';
-            div.style.color = 'white';
-            div.style.fontSize = '2rem';
-            div.style.display = 'flex';
-            div.style.alignItems = 'center';
-            div.style.justifyContent = 'center';
-            div.style.zIndex = 9999;
-            document.body.appendChild(div);
-        }
-        }""")
+    if state.active_replays == 1 and state.active_page:
+        try:
+            await state.active_page.evaluate(REPLAY_OVERLAY_SCRIPT)
+        except Exception as e:
+            logger.warning(f"[Replay] Could not show the recorder overlay: {e}")
 
-    flow = json.loads(json_str)
+async def end_replay():
+    state.active_replays = max(0, state.active_replays - 1)
+    state.is_replaying = state.active_replays > 0
+    if not state.active_replays and state.active_page:
+        try:
+            await state.active_page.evaluate(REMOVE_REPLAY_OVERLAY_SCRIPT)
+        except Exception as e:
+            logger.warning(f"[Replay] Could not remove the recorder overlay: {e}")
 
-    global steps_by_parent
-    steps_by_parent = {}
-    for step in flow:
-        pid = step.get("parentId")
-        if pid:
-            steps_by_parent.setdefault(pid, []).append(step)
+async def replay_flow(flow_data, profile=None, har=None, har_strict=False):
+    """Replays a flow given as JSON (str or bytes) or as a compact flow container.
 
-    for children in steps_by_parent.values():
-        children.sort(key=lambda x: x.get("timestamp", 0))
+    `profile` names a replay profile; `har` serves network responses from a recorded archive instead of the live site.
+    """
+    started = time.perf_counter()
+    har_replay = HarReplay(har, strict=har_strict) if har else None
+    await begin_replay()
+    try:
+        plan = get_flow_plan(flow_data)
+        profile = get_replay_profile(profile)
+        network = NetworkStats()
 
-    async with async_playwright() as p:
-        browser = await launch_chrome(p)
+        async with async_playwright() as p:
+            row_engine = await register_row_engine(p)
+            browser = await launch_chrome(p, headless=profile.headless)
+            try:
+                result = await run_replay(browser, plan, profile, network, har_replay, row_engine, started)
+            finally:
+                try:
+                    await browser.close()
+                except Exception as e:
+                    logger.warning(f"[Replay] Browser close failed: {e}")
+    finally:
+        # Cancelled or failed replays must not leave the recorder dropping events behind the overlay
+        await end_replay()
+
+    if har_replay:
+        # Strict misses fail the job only now, with the browser closed and the recorder released
+        har_replay.check()
+    return result
+
+async def run_replay(browser, plan, profile, network, har_replay, row_engine, started):
+    if profile.active or har_replay:
+        context = await new_profile_context(browser, profile, recorded_viewport(plan.steps), network)
+        if har_replay:
+            await har_replay.attach(context)
+        page = await context.new_page()
+    else:
         context = browser.contexts[0] if browser.contexts else await browser.new_context()
         page = await context.new_page()
-
-        top_level_steps = [s for s in flow if not s.get("parentId")]
-
-        steps_by_id = {step["id"]: step for step in flow}
-        page.context._botflows_steps_by_id = steps_by_id
-
-        for step in top_level_steps:
-            await handle_step(step, page)
-
-        logger.info("Replay complete.")
-        await browser.close()
-        if state.active_page:
-            await state.active_page.evaluate("""() => {
-            window.__botflows_replaying__ = false;
-            const div = document.getElementById('botflows-replay-overlay');
-            if (div) div.remove();
-            }""")
-        state.is_replaying = False
+        # Only this page: a reused Chrome context has the user's other tabs in it
+        network.attach(page)
+    page.context._botflows_row_engine = row_engine
+    page.context._botflows_profile = profile
+    page.context._botflows_network = network
+    page.context._botflows_har = har_replay
+
+    page.context._botflows_plan = plan
+    page.context._botflows_datatables = {}
+    page.context._botflows_budget_report = BudgetReport()
+    trace = ReplayTrace()
+    page.context._botflows_trace = trace
+    recovery = SelectorRecoveryClient(plan.steps, window=RECOVERY_BATCH_SIZE)
+    page.context._botflows_recovery = recovery
+    status = "ok"
+    try:
+        if RECOVERY_PREFETCH:
+            await recovery.prefetch()
+        trace.start(len(plan.steps))
+        for node in plan.roots:
+            await handle_step(node, page)
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        trace.close(status)
+        await recovery.aclose(wait=status != "cancelled")
+
+    await network.settle()
+    logger.info("Replay complete.")
+    logger.info(page.context._botflows_budget_report.summary())
+    result = {
+        "runId": trace.run_id,
+        "datatables": page.context._botflows_datatables,
+        "budget": page.context._botflows_budget_report.steps,
+        "network": replay_summary(started, network, profile),
+    }
+    if har_replay:
+        result["har"] = {"name": har_replay.name, "strict": har_replay.strict, "misses": har_replay.misses}
+    logger.info(f"[Profile] {result['network']}")
+    return result
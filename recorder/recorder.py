@@ -5,9 +5,16 @@ from pathlib import Path
 from playwright.async_api import async_playwright
 import sys
 import re
+import time
 from common import state
 from common.browserutil import launch_chrome
 from common.dom_snapshot import upload_snapshot_to_api
+from common.frameHelper import get_frame_path
+from common.metricsHelper import EVENT_QUEUE_DEPTH, WS_BROADCAST_LAG_SECONDS
+from common.recordHelper import BlobStore, EventRecord
+from common.coalesceHelper import EventCoalescer
+from common.harHelper import har_record_options
+from common.navigationHelper import NavigationMarker
 from common import selectorHelper
 # selector_builder.py
 from common.selectorHelper import get_devtools_like_selector
@@ -16,6 +23,10 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 recorded_events = []
+# outerHTML is shared between events of the same element for the whole session
+event_blobs = BlobStore()
+event_coalescer = EventCoalescer()
+navigation_marker = NavigationMarker()
 
 # Resolve paths
 BASE_DIR = Path(getattr(sys, "_MEIPASS", Path(__file__).parent.resolve()))
@@ -92,15 +103,31 @@ remove_grid_overlay_script = """
 """
 
 standard_event_queue = asyncio.Queue()
+# Looked up at scrape time, so flushing (replacing) the queue is picked up too
+EVENT_QUEUE_DEPTH.set_function(lambda: standard_event_queue.qsize())
 
 async def standard_event_worker():
     while True:
-        page, event = await standard_event_queue.get()
+        queue = standard_event_queue
+        # A held event is released once nothing has followed it for a moment
+        timeout = event_coalescer.hold_seconds if event_coalescer.pending else None
+        try:
+            page, event = await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            await emit_events(event_coalescer.flush())
+            continue
         try:
             await handle_standard_event(page, event)
         except Exception as e:
             logger.error(f"[Event Worker] Error processing event: {e}")
-        standard_event_queue.task_done()
+        queue.task_done()
+
+async def emit_events(events: list):
+    for event in events:
+        # A click goes out once it is known whether it navigated, so the flag is in the saved flow
+        await navigation_marker.settled(event)
+        recorded_events.append(event)
+        await broadcast_to_clients(event.to_dict())
 
 def flush_standard_event_queue():
     global standard_event_queue
@@ -131,40 +158,33 @@ async def handle_event(source, event):
     if type == "targetPicked":
         await handle_target_picked(page, event)
     else:
-        await standard_event_queue.put((page, event))
-
-async def handle_standard_event(page, event):
-    meta = {
-        "tagName": event.get("tagName", ""),
-        "id": event.get("id", ""),
-        "name": event.get("name", ""),
-        "classList": event.get("classList", []),
-        "attributes": event.get("attributes", {}),
-        "innerText": event.get("innerText", ""),
-        "outerHTML": event.get("outerHTML", ""),
-        "domPath": event.get("domPath", ""),
-        "xpath": event.get("xpath", "")
-    }
-
+        # The binding source knows which frame fired the event; replay targets it directly
+        frame_path = get_frame_path(source.get("frame")) if isinstance(source, dict) else []
+        record = EventRecord.from_event(event, event_blobs, frame_path)
+        # Noted on arrival: the navigation can land while the event is still queued
+        navigation_marker.note(record)
+        await standard_event_queue.put((page, record))
+
+async def handle_standard_event(page, event: EventRecord):
     # Extract dynamic parameter mapping if present
-    attrs = event.get("attributes", {})
+    attrs = event.attributes or {}
 
     if "data-dynamic-value" in attrs:
-        event["dynamicValue"] = attrs["data-dynamic-value"]
+        event.dynamicValue = attrs["data-dynamic-value"]
 
     if "data-transform-type" in attrs and "data-transform" in attrs:
         transform_type = attrs["data-transform-type"]
         transform_value = attrs["data-transform"]
 
-        event["transformType"] = transform_type
-        event["transform"] = transform_value
+        event.transformType = transform_type
+        event.transform = transform_value
 
         logger.info(f"[Transform Detected] {transform_type}: {transform_value}")
     else:
         logger.info("[Transform Detected] No transform type or value found.")
 
     if "data-botflows-mapped" in attrs:
-        event["mappedScope"] = attrs["data-botflows-mapped"]
+        event.mappedScope = attrs["data-botflows-mapped"]
 
     # best_selector, selector_list = await generate_and_validate_selectors(meta, page, event, True)
 
@@ -181,14 +201,18 @@ async def handle_standard_event(page, event):
     # else:
     #     logger.warning("[Selector Validation] No valid selectors found, keeping original")
 
-    recorded_events.append(event)
     try:
-        await page.evaluate("window.hideValidationOverlay()")
-        await page.evaluate("window.__pendingValidation = false")
+        # One round trip; the viewport lets headless replays lay the page out like the recording
+        event.viewport = await page.evaluate("""() => {
+            window.hideValidationOverlay();
+            window.__pendingValidation = false;
+            return { width: window.innerWidth, height: window.innerHeight };
+        }""")
     except Exception as e:
         logger.warning(f"Failed to clear pendingValidation: {e}")
 
-    await broadcast_to_clients(event)
+    # Redundant focus/mousedown/input events are merged away before they reach the UI
+    await emit_events(event_coalescer.push(event))
 
 # async def handle_picker_event(page, event):
 #     metadata = event.get("metadata", {})
@@ -268,6 +292,7 @@ async def handle_standard_event(page, event):
 #     await broadcast_to_clients(response)
 
 async def handle_target_picked(page, event):
+    started = time.perf_counter()
     try:
         await page.evaluate(analyzing_grid_overlay_script)
 
@@ -298,49 +323,22 @@ async def handle_target_picked(page, event):
             })
             return
 
-        row_locator = page.locator(row_selector)
-        row_count = await row_locator.count()
-        sample_index = 1 if row_count > 1 else 0  # skip header row if possible
-        sample_row = row_locator.nth(sample_index)
-
-        successful_selectors = []
+        probe = await probe_column_selectors(page, row_selector, len(column_headers))
         column_mappings = []
 
         for idx, header in enumerate(column_headers):
-            reusable = [s for s in successful_selectors if f"colindex='{idx}'" in s or f"nth-child({idx + 1})" in s]
-            sel_patterns = reusable + [
-                f"div[role='gridcell'][data-colindex='{idx}']",
-                f"[role='cell']:nth-child({idx + 1})",
-                f"td:nth-of-type({idx + 1})",
-                f"td:nth-of-type({idx + 1}) input",
-                f"td:nth-of-type({idx + 1}) div",
-                f"td:nth-of-type({idx + 1}) *"
-            ]
-            matched_selector = None
-
-            for sel in sel_patterns:
-                try:
-                    cell = sample_row.locator(sel)
-                    await cell.wait_for(state="attached", timeout=800)
-                    await cell.wait_for(state="visible", timeout=800)
-                    txt = await cell.inner_text()
-                    if txt.strip():
-                        matched_selector = sel
-                        if sel not in successful_selectors:
-                            successful_selectors.append(sel)
-                        break
-                except Exception as e:
-                    logger.error(f"filed grid column extraction, exception : {e}")
-                    continue
-
+            probed = probe["columns"][idx]
             column_mappings.append({
                 "header": header,
                 "columnIndex": idx,
-                "selector": matched_selector or "",
-                "extractable": bool(matched_selector),
-                "preview": txt or ""
+                "selector": probed["selector"],
+                "extractable": bool(probed["selector"]),
+                "preview": probed["preview"]
             })
 
+        analysis_ms = round((time.perf_counter() - started) * 1000)
+        logger.info(f"[Grid Analysis] {len(column_headers)} columns over {probe['sampledRows']} sample rows in {analysis_ms} ms")
+
         await broadcast_to_clients({
             "type": "targetPicked",
             "metadata": {
@@ -348,7 +346,8 @@ async def handle_target_picked(page, event):
                 "boundingBox": bounding_box,
                 "rowSelector": row_selector,
                 "columnHeaders": column_headers,
-                "columnMappings": column_mappings
+                "columnMappings": column_mappings,
+                "analysisMs": analysis_ms
             },
             "timestamp": event.get("timestamp")
         })
@@ -553,13 +552,21 @@ async def generate_and_validate_selectors(meta: dict, page, event, strict: bool
     return best_selector, validated
 
 async def broadcast_to_clients(message):
+    # Serialized once, not once per connected client
+    payload = json.dumps(message) if state.connections else None
     for ws in state.connections:
         try:
-            await ws.send_text(json.dumps(message))
-            logger.debug(f"[WS] Broadcasted: {message}")
+            await ws.send_text(payload)
+            # Lazy args: the payload (often full outerHTML) is only rendered when DEBUG is on for this module
+            logger.debug("[WS] Broadcasted: %s", message)
         except Exception as e:
             logger.warning(f"WebSocket broadcast failed: {e}")
 
+    # Recorded events carry the page's Date.now() capture time
+    captured_at = message.get("timestamp") if isinstance(message, dict) else None
+    if state.connections and isinstance(captured_at, (int, float)):
+        WS_BROADCAST_LAG_SECONDS.observe(max(0.0, time.time() - captured_at / 1000))
+
 async def handle_url_change(source, new_url):
     logger.info(f"SPA navigation detected: {new_url}")
     page = state.active_page
@@ -569,9 +576,27 @@ async def handle_url_change(source, new_url):
     await upload_snapshot_to_api(new_url, state.active_dom_snapshot)
     await reinject_scripts_if_needed(page)
 
-async def record(url: str):
+def mark_navigation(page, frame, url):
+    if frame != page.main_frame:
+        return
+    event = navigation_marker.navigated()
+    if event is not None:
+        logger.info(f"[Recorder] {event.action} on {event.selector} navigated to {url}")
+
+def on_request(page, request):
+    # Timed from the request, not the commit: a slow server's response can take longer than the window
+    try:
+        if request.is_navigation_request():
+            mark_navigation(page, request.frame, request.url)
+    except Exception as e:
+        logger.debug(f"[Recorder] Could not inspect request: {e}")
+
+async def record(url: str, har_name: str = None):
     global recorded_events
     recorded_events = []
+    event_blobs.clear()
+    event_coalescer.reset()
+    navigation_marker.reset()
     logger.info(f"[Recorder] Starting session: {url}")
     flush_standard_event_queue()
     state.is_replaying = False
@@ -589,7 +614,12 @@ async def record(url: str):
 
     async with async_playwright() as p:
         browser = await launch_chrome(p)
-        context = browser.contexts[0] if browser.contexts else await browser.new_context(no_viewport=True)
+        if har_name:
+            # A fresh context: the archive is written when it closes, and the user's own tabs stay out of it
+            context = await browser.new_context(no_viewport=True, **har_record_options(har_name))
+            logger.info(f"[Recorder] Capturing network traffic to HAR '{har_name}'")
+        else:
+            context = browser.contexts[0] if browser.contexts else await browser.new_context(no_viewport=True)
 
         for tab in context.pages:
             if tab.url == "about:blank":
@@ -640,6 +670,9 @@ async def record(url: str):
             await upload_snapshot_to_api(new_url, snapshot)
 
         page.on("framenavigated", lambda frame: asyncio.create_task(reinject_on_spa_change(frame.url)))
+        page.on("request", lambda request: on_request(page, request))
+        # Same-document (history API) navigations send no request
+        page.on("framenavigated", lambda frame: mark_navigation(page, frame, frame.url))
 
         async def wait_for_tab_close():
             while not page.is_closed():
@@ -662,5 +695,13 @@ async def record(url: str):
                 asyncio.create_task(wait_for_stop_flag())
             ], return_when=asyncio.FIRST_COMPLETED)
         finally:
+            if har_name:
+                try:
+                    await context.close()
+                    await broadcast_to_clients({"type": "harRecorded", "har": har_name})
+                except Exception as e:
+                    logger.error(f"[Recorder] Could not save HAR '{har_name}': {e}")
             await browser.close()
-            logger.info(f"[Recorder] Session complete. {len(recorded_events)} events captured.")
+            await emit_events(event_coalescer.flush())
+            saved = sum(event_coalescer.saved.values())
+            logger.info(f"[Recorder] Session complete. {len(recorded_events)} events captured, {saved} redundant events merged {dict(event_coalescer.saved)}.")
@@ -0,0 +1,233 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from common.httpHelper import ApiClient, CircuitBreaker, CircuitOpen  # noqa: E402
+
+
+class StubBackend:
+    """Local HTTP/1.1 server answering POSTs from a script of (status, delay) replies; records every request."""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                backend.requests.append({"path": self.path, "port": self.client_address[1],
+                                         "body": self.rfile.read(length)})
+                status, delay = backend.script.pop(0) if backend.script else (200, 0)
+                if delay:
+                    time.sleep(delay)
+                body = json.dumps({"ok": status == 200}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def backend():
+    stub = StubBackend()
+    yield stub
+    stub.close()
+
+
+def make_client(url, **kwargs):
+    kwargs.setdefault("retries", 2)
+    return ApiClient(base_url=url, api_key="test", timeout=kwargs.pop("timeout", 2.0), backoff=0, **kwargs)
+
+
+def run(client, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_idempotent_call_retries_server_errors(backend):
+    backend.script = [(503, 0), (502, 0)]
+    client = make_client(backend.url)
+    response = run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert response.status_code == 200
+    assert len(backend.requests) == 3
+    assert client.breaker.state == "closed"
+
+
+def test_idempotent_call_returns_last_error_when_retries_run_out(backend):
+    backend.script = [(503, 0)] * 3
+    client = make_client(backend.url)
+    response = run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert response.status_code == 503
+    assert len(backend.requests) == 3
+
+
+def test_non_idempotent_call_is_not_repeated_after_bad_gateway(backend):
+    backend.script = [(502, 0)]
+    client = make_client(backend.url)
+    response = run(client, client.post("/api/selectoranalysis/submit", json={}))
+    assert response.status_code == 502
+    assert len(backend.requests) == 1
+
+
+def test_non_idempotent_call_is_retried_when_rejected_with_429(backend):
+    backend.script = [(429, 0)]
+    client = make_client(backend.url)
+    response = run(client, client.post("/api/selectoranalysis/confirm", json={}))
+    assert response.status_code == 200
+    assert len(backend.requests) == 2
+
+
+def test_non_idempotent_call_is_not_repeated_after_read_timeout(backend):
+    backend.script = [(200, 1.0)]
+    client = make_client(backend.url, timeout=0.3)
+    with pytest.raises(httpx.ReadTimeout):
+        run(client, client.post("/api/selectoranalysis/submit", json={}))
+    assert len(backend.requests) == 1
+
+
+def test_idempotent_call_is_retried_after_read_timeout(backend):
+    backend.script = [(200, 1.0)]
+    client = make_client(backend.url, timeout=0.3)
+    response = run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert response.status_code == 200
+    assert len(backend.requests) == 2
+
+
+def test_connect_errors_are_retried_for_any_call():
+    stub = StubBackend()
+    url = stub.url
+    stub.close()  # nothing listens on the port any more
+    client = make_client(url, breaker=CircuitBreaker(failure_threshold=10))
+    with pytest.raises(httpx.ConnectError):
+        run(client, client.post("/api/selectoranalysis/submit", json={}))
+    assert client.breaker.failures == 3
+
+
+def test_requests_share_one_keep_alive_connection(backend):
+    client = make_client(backend.url)
+
+    async def several():
+        for _ in range(5):
+            await client.post("/api/selectoranalysis/resolve", json={}, idempotent=True)
+
+    run(client, several())
+    assert len(backend.requests) == 5
+    assert len({r["port"] for r in backend.requests}) == 1
+
+
+def test_client_is_reopened_for_a_new_event_loop(backend):
+    client = make_client(backend.url)
+    run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert len(backend.requests) == 2
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=0.05)
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_open_breaker_fails_calls_fast(backend):
+    client = make_client(backend.url, breaker=CircuitBreaker(failure_threshold=1, reset_after=60))
+    client.breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert backend.requests == []
+
+
+def test_breaker_stops_retries_once_open(backend):
+    backend.script = [(503, 0)] * 3
+    client = make_client(backend.url, breaker=CircuitBreaker(failure_threshold=2, reset_after=60))
+    response = run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+    assert response.status_code == 503
+    assert len(backend.requests) == 2
+    assert client.breaker.state == "open"
+
+
+def test_cancelled_probe_lets_the_next_call_probe(backend):
+    backend.script = [(200, 1.0)]
+    client = make_client(backend.url, breaker=CircuitBreaker(failure_threshold=1, reset_after=0.05))
+    client.breaker.record_failure()
+    time.sleep(0.06)
+
+    async def cancelled_then_retried():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.post("/api/selectoranalysis/resolve", json={}, idempotent=True), 0.2)
+        assert client.breaker.state == "half-open"
+        return await client.post("/api/selectoranalysis/resolve", json={}, idempotent=True)
+
+    response = run(client, cancelled_then_retried())
+    assert response.status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_client_of_a_running_loop_is_closed_when_another_loop_takes_over(backend):
+    client = make_client(backend.url)
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(
+            client.post("/api/selectoranalysis/resolve", json={}, idempotent=True), other).result(5)
+        old = client._client
+        run(client, client.post("/api/selectoranalysis/resolve", json={}, idempotent=True))
+        time.sleep(0.2)
+        assert old.is_closed
+        assert client._client is None
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
@@ -0,0 +1,34 @@
+import os
+import time
+
+from common.traceHelper import ReplayTrace, prune_traces
+
+
+def make_traces(trace_dir, names, age_days=0):
+    stamp = time.time() - age_days * 24 * 3600
+    for name in names:
+        path = trace_dir / f"{name}.jsonl"
+        path.write_text("{}\n", encoding="utf-8")
+        os.utime(path, (stamp, stamp))
+
+
+def test_prune_keeps_the_newest_runs(tmp_path):
+    make_traces(tmp_path, [f"20260101-00000{i}-abcdef" for i in range(5)])
+    assert prune_traces(tmp_path, keep_runs=2, keep_days=0) == 3
+    assert sorted(p.stem for p in tmp_path.glob("*.jsonl")) == ["20260101-000003-abcdef", "20260101-000004-abcdef"]
+
+
+def test_prune_drops_runs_older_than_the_age_limit(tmp_path):
+    make_traces(tmp_path, ["20260101-000000-old000"], age_days=30)
+    make_traces(tmp_path, ["20260201-000000-new000"])
+    assert prune_traces(tmp_path, keep_runs=0, keep_days=14) == 1
+    assert [p.stem for p in tmp_path.glob("*.jsonl")] == ["20260201-000000-new000"]
+
+
+def test_opening_a_trace_keeps_the_directory_within_the_limit(tmp_path):
+    make_traces(tmp_path, [f"20260101-00000{i}-abcdef" for i in range(5)])
+    trace = ReplayTrace(tmp_path, keep_runs=3, keep_days=0)
+    trace.close()
+    files = sorted(p.name for p in tmp_path.glob("*.jsonl"))
+    assert len(files) == 3
+    assert trace.path.name in files
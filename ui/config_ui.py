@@ -3,15 +3,16 @@ from sys import platform
 import tempfile
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json
 import os
 import shutil
 import subprocess
 import asyncio
+import sys
 from playwright.async_api import async_playwright
 
-CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "ui")
-CONFIG_FILE = os.path.join(CONFIG_DIR, "agent_config.json")
+# Run directly as a script too, so make the repo root importable for the shared config schema
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.agentConfigHelper import CONFIG_PATH as CONFIG_FILE, DEFAULT_CONFIG, read_config_file, save_config_file
 LOCK_FILE = os.path.join(tempfile.gettempdir(), "botflows_settings.lock")
 
 _settings_window = None  # Track if window is open
@@ -35,29 +36,21 @@ def find_chrome_executable():
 
 
 def load_config():
-    default = {
-        "use_bundled_chrome": False,
-        "chrome_path": ""
-    }
-
+    cfg = dict(DEFAULT_CONFIG)
     if os.path.exists(CONFIG_FILE):
         try:
-            with open(CONFIG_FILE, "r") as f:
-                cfg = json.load(f)
-                if not cfg.get("chrome_path"):
-                    cfg["chrome_path"] = find_chrome_executable()
-                return {**default, **cfg}
+            cfg = read_config_file(CONFIG_FILE)
         except Exception:
             pass
 
-    default["chrome_path"] = find_chrome_executable()
-    return default
+    if not cfg.get("chrome_path"):
+        cfg["chrome_path"] = find_chrome_executable()
+    return cfg
 
 
 def save_config(cfg):
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(cfg, f, indent=2)
+    # The running agent picks the change up from the file's mtime, no restart needed
+    save_config_file(cfg, CONFIG_FILE)
 
 def bring_window_to_front(window):
     try: